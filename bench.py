@@ -0,0 +1,417 @@
+"""
+Benchmarks de parseo y extracción sobre páginas de detalle guardadas.
+
+Uso:
+    python bench.py extract <directorio con páginas .html> [repeticiones]
+    python bench.py parsers <directorio con páginas .html> [repeticiones]
+    python bench.py fields <directorio con páginas .html> [repeticiones]
+    python bench.py lite <directorio con páginas .html> [repeticiones]
+    python bench.py stages <directorio con páginas .html> [repeticiones] [--results fichero]
+    python bench.py e2e <directorio con páginas .html> [--pages N] [--latency segundos] [--results fichero]
+    python bench.py compare [--results fichero]
+
+extract: compara extract_data_from_html (un único recorrido del árbol) con la
+composición de los extractores extract_* individuales, que recorren el árbol una
+vez cada uno.
+
+parsers: mide el rendimiento de parseo de cada backend y comprueba que la salida
+JSON de cada página es idéntica en todos ellos: contra <página>.golden.json si existe
+(como en tests/fixtures) o, si no, contra la salida de html.parser.
+
+fields: activa extract.profile_fields y muestra el coste de cada campo de field_specs
+(y del recorrido scan_document), del más costoso al menos.
+
+lite: compara extract_html en modo full y lite, y comprueba que los campos leídos
+directamente de los bloques JSON embebidos coinciden con los obtenidos del DOM.
+
+stages: coste por etapa de la canalización: parseo de fichas y listados, lectura de
+los bloques embebidos, recorrido único, cada extractor extract_*, traducción con un
+backend falso (caché vacía y caliente) y serialización con cada compresión.
+Los listados salen de <directorio>/listings/*.html o, si no hay, se generan.
+
+e2e: rastreo completo contra un servidor local que sirve las fichas del directorio y
+listados hechos con las tarjetas de <directorio>/listings (o sintéticos si no hay),
+con la latencia indicada por respuesta. La extracción se hace en hilos del propio
+proceso para que el backend de traducción falso siga activo.
+
+stages y e2e añaden una línea JSON por ejecución al fichero de resultados (commit,
+fecha y métricas); compare muestra la variación de cada métrica entre las dos
+últimas ejecuciones de cada comando.
+
+Las traducciones se desactivan (o usan un backend falso) para medir solo el coste de CPU.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from idealista import config, extract
+from idealista.crawler import AsyncCrawler
+from idealista.listing import parse_listing
+from idealista.metrics import logger, metrics as crawl_metrics
+from idealista.output import ColumnarWriter, RecordWriter
+from idealista.store import CrawlFrontier
+from idealista.translate import TranslationCache, translate_comment as real_translate_comment
+
+results_file = "bench_results.ndjson"
+
+# Extractores individuales que mide stages, cada uno con su propio recorrido del árbol
+extractors = [
+    ("extract_administrative_areas", extract.extract_administrative_areas),
+    ("extract_utag_data", extract.extract_utag_data),
+    ("extract_multimedia", extract.extract_multimedia),
+    ("extract_energy_certification", extract.extract_energy_certification),
+    ("check_offer_text", extract.check_offer_text),
+    ("extract_remote_visit_and_360", extract.extract_remote_visit_and_360),
+    ("check_mortgage_simluator", extract.check_mortgage_simluator),
+    ("extract_allow_recommendation", extract.extract_allow_recommendation),
+    ("extract_modification_date", extract.extract_modification_date),
+]
+
+def legacy_extract(soup):
+    """Extracción por campos con un recorrido del árbol por cada extractor."""
+    data = {}
+    adid_tag = soup.find('div', class_='ad-reference-container')
+    adid = adid_tag.find('p', class_='txt-ref') if adid_tag else None
+    data["adid"] = adid.get_text(strip=True) if adid else None
+    data["price"] = soup.find('span', class_='info-data-price')
+    data["title"] = soup.find('span', class_='main-info__title-minor')
+    map_tag = soup.find('div', class_='map')
+    data["latlon"] = extract.extract_lat_lon(map_tag.get('data-url') if map_tag else None)
+    data["administrativeAreas"] = extract.extract_administrative_areas(soup)
+    data["multimedia"] = extract.extract_multimedia(soup)
+    data["utag"] = extract.extract_utag_data(soup)
+    data["comment"] = soup.find('div', class_='comment')
+    link = soup.find('link', rel='canonical')
+    data["detailWebLink"] = link['href'] if link else None
+    data["energyCertification"] = extract.extract_energy_certification(soup)
+    data["allowsCounterOffers"] = extract.check_offer_text(soup)
+    data["allowsRemoteVisit"] = extract.extract_remote_visit_and_360(soup)["allowsRemoteVisit"]
+    data["has360VHS"] = extract.extract_remote_visit_and_360(soup)["has360VHS"]
+    data["allowsMortgageSimulator"] = extract.check_mortgage_simluator(soup)
+    data["allowsRecommendation"] = extract.extract_allow_recommendation(soup)
+    data["modificationDate"] = extract.extract_modification_date(soup)
+    return data
+
+def timed(function, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            function(item)
+    return time.perf_counter() - start
+
+def bench_extract(paths, repeat):
+    soups = [extract.make_soup(path.read_text(encoding="utf-8")) for path in paths]
+    legacy = timed(legacy_extract, soups, repeat)
+    single_pass = timed(extract.extract_data_from_html, soups, repeat)
+    total = len(soups) * repeat
+    print(f"extract_* por campo: {legacy / total * 1000:.3f} ms/página")
+    print(f"un solo recorrido:   {single_pass / total * 1000:.3f} ms/página")
+    print(f"aceleración:         {legacy / single_pass:.2f}x")
+
+def bench_parsers(paths, repeat):
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    megabytes = sum(len(html.encode("utf-8")) for html in pages) * repeat / 1e6
+    total = len(pages) * repeat
+    backends = [backend for backend in config.parser_backends if backend != "selectolax" or importlib.util.find_spec("selectolax")]
+
+    mismatches = 0
+    for path, html in zip(paths, pages):
+        golden_path = path.with_suffix(".golden.json")
+        if golden_path.exists():
+            golden = golden_path.read_text(encoding="utf-8")
+        else:
+            golden = extract.comparable_json(extract.extract_data_from_html(extract.make_soup(html, "html.parser"), translate=False))
+        for backend in backends:
+            if extract.comparable_json(extract.extract_data_from_html(extract.make_soup(html, backend), translate=False)) != golden:
+                print(f"DIFERENCIA: {path.name} con {backend}")
+                mismatches += 1
+
+    for backend in backends:
+        detail = timed(lambda html: extract.extract_data_from_html(extract.make_soup(html, backend)), pages, repeat)
+        listing = timed(lambda html: parse_listing(html, backend=backend), pages, repeat)
+        print(f"{backend:12} ficha: {total / detail:8.1f} páginas/s ({megabytes / detail:6.2f} MB/s)"
+              f"   listado: {total / listing:8.1f} páginas/s ({megabytes / listing:6.2f} MB/s)")
+    print("Salida idéntica en todos los backends." if not mismatches else f"{mismatches} diferencias.")
+    return mismatches
+
+def bench_fields(paths, repeat):
+    """Coste acumulado de cada campo declarado en extract.field_specs."""
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    soups = [extract.make_soup(html) for html in pages]
+    extract.profile_fields = True
+    extract.field_timings.clear()
+    for _ in range(repeat):
+        for soup in soups:
+            extract.extract_data_from_html(soup)
+    extract.profile_fields = False
+    total = sum(seconds for _, _, seconds in extract.field_timing_report())
+    for name, calls, seconds in extract.field_timing_report():
+        print(f"{name:30} {seconds / calls * 1000:8.3f} ms/llamada {seconds / total * 100:6.1f} %")
+
+def bench_lite(paths, repeat):
+    """Modo full frente a lite, y comprobación de que los bloques embebidos coinciden con el DOM."""
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    total = len(pages) * repeat
+    mismatches = 0
+    for path, html in zip(paths, pages):
+        full = extract.extract_data_from_html(extract.make_soup(html))
+        lite = extract.extract_html(html, "lite")
+        for key in ("moreCharacteristics", "allowsRemoteVisit", "has360VHS", "allowsRecommendation"):
+            if full.get(key) != lite.get(key):
+                mismatches += 1
+                print(f"{path.name}: {key} distinto en modo lite")
+        if full["ubication"].get("locationId") != lite["ubication"].get("locationId"):
+            mismatches += 1
+            print(f"{path.name}: locationId distinto en modo lite")
+    for mode in ("full", "lite"):
+        elapsed = timed(lambda html: extract.extract_html(html, mode), pages, repeat)
+        print(f"{mode:6} {total / elapsed:10.1f} páginas/s")
+    print("Bloques embebidos idénticos al DOM." if not mismatches else f"{mismatches} diferencias.")
+    return mismatches
+
+def listing_html(page, pages, ads_per_page):
+    """Listado sintético con la estructura de tarjetas de idealista y enlace a la página siguiente."""
+    cards = []
+    for index in range(ads_per_page):
+        adid = (page - 1) * ads_per_page + index + 1
+        cards.append(
+            f'<article class="item" data-element-id="{adid}"><div class="item-info-container">'
+            f'<a class="item-link" href="/inmueble/{adid}/" title="Piso {adid}">Piso {adid}</a>'
+            f'<div class="price-row"><span class="item-price h2-simulated">{100 + adid}.000'
+            f'<span class="txt-big">€</span></span></div>'
+            f'<div class="item-detail-char"><span class="item-detail">3 hab.</span>'
+            f'<span class="item-detail">90 m²</span></div></div>'
+            f'<picture><img src="/img/{adid}.jpg" alt="Piso"></picture></article>'
+        )
+    next_link = f'<a class="icon-arrow-right-after" href="?pagina={page + 1}">Siguiente</a>' if page < pages else ""
+    return (f'<html><body><h1>{pages * ads_per_page} casas y pisos en venta</h1>'
+            f'{"".join(cards)}<div class="pagination">{next_link}</div></body></html>')
+
+def listing_pages(pages_dir, count=5, ads_per_page=30):
+    """Listados guardados en <directorio>/listings o, si no hay, generados."""
+    saved = sorted((pages_dir / "listings").glob("*.html"))
+    if saved:
+        return [path.read_text(encoding="utf-8") for path in saved]
+    return [listing_html(page, count, ads_per_page) for page in range(1, count + 1)]
+
+card_pattern = re.compile(r'<article\b.*?</article>', re.DOTALL)
+next_link_pattern = re.compile(r'<a class="icon-arrow-right-after".*?</a>', re.DOTALL)
+
+def recorded_listing(html, page, pages, ads_per_page):
+    """
+    Página `page` de un rastreo de `pages` páginas con las tarjetas de un listado grabado:
+    se repiten hasta `ads_per_page` con adid únicos y el enlace siguiente apunta a ?pagina=N.
+    """
+    templates = card_pattern.findall(html)
+    cards = []
+    for index in range(ads_per_page):
+        adid = (page - 1) * ads_per_page + index + 1
+        card = templates[index % len(templates)]
+        card = re.sub(r'/inmueble/\d+/', f'/inmueble/{adid}/', card)
+        cards.append(re.sub(r'data-element-id="\d+"', f'data-element-id="{adid}"', card))
+    head, tail = html[:html.index(templates[0])], html[html.rindex(templates[-1]) + len(templates[-1]):]
+    next_link = f'<a class="icon-arrow-right-after" href="?pagina={page + 1}">Siguiente</a>' if page < pages else ""
+    tail = next_link_pattern.sub("", tail).replace("</body>", f'<div class="pagination">{next_link}</div></body>')
+    return head + "".join(cards) + tail
+
+def crawl_listings(pages_dir, count, ads_per_page):
+    """Listados de un rastreo de `count` páginas: hechos con los grabados en <directorio>/listings o sintéticos."""
+    saved = sorted((pages_dir / "listings").glob("*.html"))
+    if saved:
+        return [recorded_listing(saved[(page - 1) % len(saved)].read_text(encoding="utf-8"), page, count, ads_per_page)
+                for page in range(1, count + 1)]
+    return [listing_html(page, count, ads_per_page) for page in range(1, count + 1)]
+
+def per_page(function, items, repeat):
+    """Milisegundos por elemento de aplicar function a items repeat veces."""
+    return timed(function, items, repeat) / (len(items) * repeat) * 1000
+
+def bench_stages(paths, repeat):
+    """Coste por etapa, en ms por página (o por registro en la serialización)."""
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    listings = listing_pages(paths[0].parent)
+    soups = [extract.make_soup(html) for html in pages]
+    metrics = {
+        "parse.detail_ms": per_page(extract.make_soup, pages, repeat),
+        "parse.listing_ms": per_page(parse_listing, listings, repeat),
+        "scan_embedded_ms": per_page(extract.scan_embedded, pages, repeat),
+        "scan_document_ms": per_page(extract.scan_document, soups, repeat),
+        "extract_data_from_html_ms": per_page(lambda soup: extract.extract_data_from_html(soup, translate=False), soups, repeat),
+    }
+    for name, extractor in extractors:
+        metrics[f"extract.{name}_ms"] = per_page(extractor, soups, repeat)
+
+    # Traducción con un backend falso: coste propio de translate_comment y de la caché
+    comments = [found["comment"].find('p').get_text(strip=True)
+                for found in map(extract.scan_document, soups) if found.get("comment") and found["comment"].find('p')]
+    if comments:
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TranslationCache(os.path.join(directory, "translations.sqlite"))
+            fake_backend = lambda text, lang: text
+            translate = lambda text: real_translate_comment(text, translator=fake_backend, cache=cache)
+            metrics["translate.cold_ms"] = per_page(translate, comments, 1)
+            metrics["translate.warm_ms"] = per_page(translate, comments, repeat)
+            cache.close()
+
+    records = [extract.extract_data_from_html(soup, translate=False) for soup in soups]
+    metrics["serialize.json_ms"] = per_page(lambda record: json.dumps(record, ensure_ascii=False), records, repeat)
+    compressions = [None, "gzip"] + (["zstd"] if importlib.util.find_spec("zstandard") else [])
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in compressions:
+            with RecordWriter(os.path.join(directory, f"out-{compression}"), compression) as writer:
+                metrics[f"serialize.write_{compression or 'plain'}_ms"] = per_page(writer.write, records, repeat)
+        if importlib.util.find_spec("pyarrow"):
+            with ColumnarWriter(os.path.join(directory, "out.parquet")) as writer:
+                metrics["serialize.write_parquet_ms"] = per_page(writer.write, records, repeat)
+
+    for name, value in metrics.items():
+        print(f"{name:45} {value:10.3f}")
+    return metrics
+
+def mock_server(pages, listings, latency):
+    """Servidor HTTP local: / , listados ?pagina=N y fichas /inmueble/<adid>/ tomadas del corpus."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            path, _, query = self.path.partition("?")
+            if path.startswith("/inmueble/"):
+                body = pages[int(path.strip("/").split("/")[-1]) % len(pages)]
+            elif query.startswith("pagina="):
+                body = listings[int(query.split("=")[1]) - 1]
+            else:
+                body = "<html><body>bench</body></html>"
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_e2e(paths, listing_count, latency, ads_per_page=30):
+    """Anuncios por segundo de un rastreo completo contra el servidor local."""
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    listings = crawl_listings(paths[0].parent, listing_count, ads_per_page)
+    server = mock_server(pages, listings, latency)
+    site = f"http://127.0.0.1:{server.server_address[1]}"
+    config.max_requests_per_second = 1000.0
+    with tempfile.TemporaryDirectory() as directory:
+        frontier = CrawlFrontier(os.path.join(directory, "frontier.sqlite"))
+        with RecordWriter(os.path.join(directory, "out.ndjson")) as writer:
+            async def run():
+                async with AsyncCrawler(writer, frontier, site, rate=1000.0, burst=config.max_concurrency,
+                                        parse_workers=0, metrics_path=None) as crawler:
+                    await crawler.crawl(f"{site}/geo/venta-viviendas/bench/")
+            start = time.perf_counter()
+            asyncio.run(run())
+            elapsed = time.perf_counter() - start
+        frontier.close()
+    server.shutdown()
+    metrics = {
+        "e2e.ads": writer.count,
+        "e2e.seconds": elapsed,
+        "e2e.ads_per_second": writer.count / elapsed,
+        "e2e.latency_s": latency,
+    }
+    # Latencia media de cada etapa según las métricas del propio rastreo
+    for stage, summary in crawl_metrics.snapshot()["stages"].items():
+        metrics[f"e2e.{stage}_mean_ms"] = summary["mean_seconds"] * 1000
+    for name, value in metrics.items():
+        print(f"{name:45} {value:10.3f}")
+    return metrics
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+def save_results(path, command, metrics, **settings):
+    """Añade la ejecución al fichero de resultados (una línea JSON por ejecución)."""
+    entry = {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+             "command": command, "settings": settings, "metrics": metrics}
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry) + "\n")
+    print(f"Resultados añadidos a {path}")
+
+def compare_results(path):
+    """Variación de cada métrica entre las dos últimas ejecuciones de cada comando."""
+    runs = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            entry = json.loads(line)
+            runs.setdefault(entry["command"], []).append(entry)
+    for command, entries in runs.items():
+        if len(entries) < 2:
+            continue
+        previous, latest = entries[-2], entries[-1]
+        print(f"{command}: {previous['commit']} -> {latest['commit']}")
+        for name, value in latest["metrics"].items():
+            before = previous["metrics"].get(name)
+            if before is None:
+                print(f"  {name:45} {'-':>12} -> {value:12.3f}")
+                continue
+            change = f"{(value - before) / before * 100:+7.1f} %" if before else ""
+            print(f"  {name:45} {before:12.3f} -> {value:12.3f} {change}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del scraper")
+    parser.add_argument("command", choices=["extract", "parsers", "fields", "lite", "stages", "e2e", "compare"])
+    parser.add_argument("pages_dir", nargs="?", type=Path, help="directorio con páginas de detalle .html")
+    parser.add_argument("repeat", nargs="?", type=int, default=20)
+    parser.add_argument("--results", default=results_file, help="fichero NDJSON de resultados (stages, e2e, compare)")
+    parser.add_argument("--pages", type=int, default=5, help="páginas de listado del servidor local (e2e)")
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos de latencia por respuesta (e2e)")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if args.command == "compare":
+        compare_results(args.results)
+        return
+    command, repeat = args.command, args.repeat
+    paths = sorted(args.pages_dir.glob("*.html")) if args.pages_dir else []
+    if not paths:
+        print(f"No hay páginas .html en {args.pages_dir}")
+        return
+
+    # Solo el comentario original, sin red: la salida coincide con la de translate=False
+    extract.translate_comment = lambda comment_text, **kwargs: real_translate_comment(comment_text, target_languages=[])
+    logger.disabled = True
+
+    print(f"Páginas: {len(paths)} x {repeat}")
+    if command == "stages":
+        save_results(args.results, command, bench_stages(paths, repeat), pages=len(paths), repeat=repeat)
+    elif command == "e2e":
+        metrics = bench_e2e(paths, args.pages, args.latency)
+        save_results(args.results, command, metrics, pages=len(paths), listings=args.pages, latency=args.latency)
+    elif command == "extract":
+        bench_extract(paths, repeat)
+    elif command == "parsers":
+        sys.exit(1 if bench_parsers(paths, repeat) else 0)
+    elif command == "lite":
+        sys.exit(1 if bench_lite(paths, repeat) else 0)
+    elif command == "fields":
+        bench_fields(paths, repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Scraper de anuncios de idealista.
+
+Los módulos pesados (httpx, bs4, deep_translator, pyarrow) no se importan aquí: cada
+subcomando de `python -m idealista` carga solo los que necesita, y
+`idealista.extract.extract_html` se puede importar sin abrir sesiones ni cachés.
+"""
@@ -0,0 +1,98 @@
+"""Línea de órdenes: cada subcomando importa solo los módulos que necesita."""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from . import config
+from .metrics import logger
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m idealista", description="Scraper de anuncios de idealista")
+    parser.add_argument("command", nargs="?", default="crawl", choices=["crawl", "reextract", "fetch", "export", "index", "query"],
+                        help="crawl: rastrea el sitio; reextract: re-extrae desde el archivo de páginas; "
+                             "fetch: descarga y extrae fichas sueltas; export: convierte la salida NDJSON a tablas Parquet; index: construye el índice "
+                             "geoespacial desde la salida NDJSON; query: consulta el índice geoespacial")
+    parser.add_argument("ads", nargs="*", help="adid o URL de cada ficha (fetch)")
+    parser.add_argument("--no-translate", action="store_true", help="no traduce los comentarios (fetch)")
+    parser.add_argument("--full-images", action="store_true", help="imágenes en su variante a máxima resolución (fetch, export)")
+    parser.add_argument("--mode", default=config.crawl_mode, choices=config.crawl_modes,
+                        help="detail: una ficha por anuncio; cards: solo las tarjetas del listado; hybrid: fichas solo para los anuncios que lo requieren (crawl)")
+    parser.add_argument("--archive", default=config.archive_dir, help="directorio del archivo de páginas (reextract)")
+    parser.add_argument("--output", default=config.reextract_output_file, help="fichero NDJSON de salida (reextract)")
+    parser.add_argument("--workers", type=int, default=config.reextract_workers, help="procesos de extracción (reextract)")
+    parser.add_argument("--input", default=config.output_file, help="fichero NDJSON a convertir o indexar (export, index)")
+    parser.add_argument("--parquet", default=config.parquet_output_dir or "idealista_output.parquet",
+                        help="directorio de las tablas Parquet (export)")
+    parser.add_argument("--geo-index", default=config.geo_index_file, help="fichero del índice geoespacial (index, query)")
+    parser.add_argument("--near", help="LAT,LON: anuncios alrededor del punto (query)")
+    parser.add_argument("--km", type=float, default=1.0, help="radio en km para --near (query)")
+    parser.add_argument("--bbox", help="SUR,OESTE,NORTE,ESTE: anuncios dentro del rectángulo (query)")
+    parser.add_argument("--by-area", type=int, choices=[1, 2, 3, 4], help="agrega por nivel administrativo (query)")
+    parser.add_argument("--limit", type=int, help="máximo de anuncios devueltos (query)")
+    args = parser.parse_args(argv)
+    if args.command == "fetch" and not args.ads:
+        parser.error("fetch necesita al menos un adid o una URL de ficha")
+    return args
+
+def run_query(args):
+    """Ejecuta la consulta de la línea de órdenes y escribe el resultado como JSON, una fila por línea."""
+    from .geo import GeoIndex
+    index = GeoIndex(args.geo_index)
+    start = time.perf_counter()
+    if args.near:
+        latitude, longitude = map(float, args.near.split(","))
+        rows = index.radius(latitude, longitude, args.km, args.limit)
+    elif args.bbox:
+        rows = index.bbox(*map(float, args.bbox.split(",")))[:args.limit]
+    else:
+        rows = index.aggregate(args.by_area or 2)[:args.limit]
+    elapsed = time.perf_counter() - start
+    index.close()
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+    logger.info(f"{len(rows)} resultados en {elapsed * 1000:.1f} ms")
+
+def run_fetch(args):
+    """Descarga las fichas pedidas y escribe cada registro como JSON, uno por línea."""
+    import asyncio
+    from .crawler import fetch_ads
+    from .extract import with_full_resolution
+    results = asyncio.run(fetch_ads(args.ads, translate_comments=not args.no_translate))
+    failed = 0
+    for target, result in zip(args.ads, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Error al extraer {target}: {result}")
+            continue
+        if args.full_images:
+            result = with_full_resolution(result)
+        print(json.dumps(result, ensure_ascii=False))
+    return 1 if failed else 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=config.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # Cada subcomando importa solo lo que usa: httpx y bs4 para descargar y extraer,
+    # pyarrow para exportar; index y query se quedan en sqlite3
+    if args.command == "reextract":
+        from .reextract import reextract
+        reextract(args.archive, args.output, args.workers)
+    elif args.command == "fetch":
+        sys.exit(run_fetch(args))
+    elif args.command == "index":
+        from .geo import build_geo_index_from
+        count = build_geo_index_from(args.input, args.geo_index, config.output_compression)
+        logger.info(f"{count} registros indexados en {args.geo_index}")
+    elif args.command == "query":
+        run_query(args)
+    elif args.command == "export":
+        from .output import write_parquet
+        count = write_parquet(args.input, args.parquet, config.output_compression, args.full_images)
+        logger.info(f"{count} registros exportados a las tablas Parquet de {args.parquet}")
+    else:
+        from .crawler import run_crawl
+        config.crawl_mode = args.mode
+        run_crawl()
@@ -0,0 +1,95 @@
+"""
+Configuración del rastreo. Los demás módulos la leen como `config.<nombre>` en cada uso:
+los parámetros que toman su valor de aquí valen None por defecto y se resuelven al
+llamar, de modo que la línea de órdenes (o quien importe el paquete) puede sobrescribirla.
+"""
+import os
+
+base_url = "https://www.idealista.com/geo/venta-viviendas/andalucia/"
+site_url = "https://www.idealista.com"
+max_concurrency = 8         # descargas simultáneas como máximo
+requests_per_second = 1.0   # presupuesto de cortesía por host
+burst_size = 3              # ráfaga máxima de peticiones por host
+min_requests_per_second = 0.1
+max_requests_per_second = 10.0
+rate_increase = 0.05        # aumento aditivo del ritmo tras cada respuesta correcta
+rate_decrease_factor = 0.5  # reducción multiplicativa ante bloqueos, 429 o errores de red
+slow_response_seconds = 5.0 # por encima de esta latencia se frena como ante un 429
+rate_decrease_cooldown = 1.0 # segundos: una ráfaga de 429 de las peticiones en vuelo frena una sola vez
+request_timeout = 30.0      # segundos por petición
+max_fetch_retries = 4       # reintentos de cada URL dentro de una ejecución
+backoff_base = 2.0          # segundos de espera del primer reintento; se duplica en cada uno
+backoff_cap = 120.0
+throttle_statuses = (403, 429, 503)
+session_count = 4           # identidades de navegación (cliente, cookies y User-Agent propios)
+session_assignment = "least-loaded"   # "least-loaded" o "round-robin"
+use_http2 = False           # requiere el paquete h2
+keepalive_connections = 10  # conexiones reutilizables por sesión
+use_http_cache = False      # caché HTTP en disco con peticiones condicionales
+http_cache_file = "http_cache.sqlite"
+http_cache_max_bytes = 2 * 1024 ** 3   # tamaño máximo de los cuerpos guardados (expulsión LRU)
+http_cache_ttl = {          # segundos en los que una respuesta se sirve sin consultar al servidor
+    "landing": 0,           # la portada siempre se revalida: su función es recibir cookies
+    "listing": 10 * 60,
+    "detail": 24 * 60 * 60,
+}
+block_page_markers = ("captcha-delivery.com", "g-recaptcha", "uso indebido", "Pardon Our Interruption")
+gallery_markers = ("main-image", "main-multimedia", "detail-image-gallery")   # id o clase de los contenedores de la galería
+image_size = "WEB_DETAIL"         # variante de tamaño con la que se guarda cada imagen
+full_image_size = "WEB_DETAIL_TOP-L-L"   # variante a máxima resolución, resuelta bajo demanda
+parser_backend = "html.parser"  # backend de parseo: "html.parser", "lxml" o "selectolax"
+parser_backends = ("html.parser", "lxml", "selectolax")
+log_level = "INFO"               # nivel de logging: "DEBUG" muestra además cada ficha y los campos ausentes
+metrics_file = "crawl_metrics.prom"   # ".prom": texto de Prometheus; ".json": instantánea JSON; None para no exportar
+metrics_interval = 30            # segundos entre líneas de progreso y exportaciones de métricas
+crawl_mode = "detail"            # "detail": una ficha por anuncio; "cards": solo las tarjetas del listado; "hybrid": fichas solo si hacen falta
+crawl_modes = ("detail", "cards", "hybrid")
+required_card_fields = ("price", "ubication.title", "moreCharacteristics.roomNumber", "moreCharacteristics.constructedArea")
+hybrid_filters = {"price": (None, 300000)}   # en modo hybrid se descarga la ficha de los anuncios dentro de estos rangos (mín, máx)
+extraction_mode = "full"         # "full": ficha completa; "lite": solo los bloques JSON embebidos de los scripts
+translation_cache_file = "translation_cache.sqlite"
+translation_cache_size = 200000   # traducciones guardadas como máximo (expulsión LRU)
+translation_workers = 8           # idiomas traducidos en paralelo
+output_file = "idealista_output.ndjson"
+output_compression = None         # None, "gzip" o "zstd"
+fsync_interval = 100              # registros escritos entre cada fsync
+legacy_output_file = "idealista_output.json"   # array JSON final; None para no generarlo
+parquet_output_dir = None        # directorio de tablas Parquet generado al terminar (p. ej. "idealista_output.parquet"); None para no generarlo
+parquet_row_group_size = 10000   # registros por grupo de filas Parquet
+frontier_file = "crawl_frontier.sqlite"
+max_detail_retries = 3            # intentos por ficha antes de darla por perdida
+incremental = False               # solo descarga fichas nuevas o modificadas y emite deltas
+ad_index_file = "ad_index.sqlite"
+detect_duplicates = False        # detecta el mismo inmueble publicado con otro adid; los duplicados no se traducen
+duplicate_index_file = "duplicates.sqlite"
+duplicate_cell_degrees = 0.002   # lado de la celda de la rejilla espacial (~200 m)
+duplicate_max_meters = 150       # distancia máxima entre duplicados
+duplicate_price_tolerance = 0.15 # diferencia relativa de precio admitida
+duplicate_area_tolerance = 0.05  # diferencia relativa de superficie admitida
+build_geo_index = False          # mantiene un índice geoespacial de los anuncios a medida que se escriben
+geo_index_file = "geo_index.sqlite"
+geohash_precision = 9            # caracteres de geohash guardados por anuncio (~5 m)
+duplicate_max_hamming = 10       # bits distintos admitidos entre los SimHash de los comentarios (de 64)
+sharded = False                   # reparte regiones, operaciones y tipos en shards por procesos
+regions = ["andalucia"]
+operations_to_crawl = ["sale"]
+property_types_to_crawl = ["homes"]
+shard_workers = 4                 # procesos que rastrean shards en paralelo
+shard_dir = "shards"
+max_pages_per_shard = 60          # tope de paginación del sitio
+results_per_page = 30
+archive_pages = False             # guarda el HTML descargado para poder re-extraer sin red
+archive_dir = "page_archive"
+reextract_output_file = "idealista_reextract.ndjson"
+reextract_workers = os.cpu_count() or 1
+parse_workers = os.cpu_count() or 1   # procesos de extracción; 0 para extraer en hilos del propio proceso
+parse_queue_size = 64                 # fichas descargadas en espera de extracción
+user_agents = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:90.0) Gecko/20100101 Firefox/90.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/91.0.864.48",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 11; SM-G973F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/93.0.4577.62 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1"
+]
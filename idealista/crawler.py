@@ -0,0 +1,453 @@
+"""Motor de descarga asíncrono y rastreo completo del listado."""
+import asyncio
+import httpx
+import time
+from concurrent.futures import ProcessPoolExecutor
+import urllib.parse as urlparse
+
+from . import config
+from .extract import adid_from_url, extract_html_measured, translate_measured
+from .geo import GeoIndex
+from .listing import card_record, needs_detail, parse_listing
+from .metrics import logger, metrics
+from .net import AdaptiveRateLimiter, SessionPool, url_class, HttpCache, FetchError, is_block_page, retry_after_seconds, backoff_delay
+from .output import RecordWriter, merge_segments, write_json_array, write_parquet
+from .store import CrawlFrontier, AdIndex, DuplicateIndex, PageArchive
+
+class AsyncCrawler:
+    """
+    Motor de descarga asíncrono. Limita las descargas simultáneas con un semáforo
+    y el ritmo por host con un limitador adaptativo, repartiendo las peticiones entre
+    un pool de sesiones con identidad y cookies propias.
+    `site_url` puede apuntar a un servidor local con HTML de prueba.
+    Las métricas solo se exportan si se pasa `metrics_path`.
+
+    Las fichas descargadas pasan por una cola acotada a un pool de procesos que las
+    parsea y extrae; si la extracción se retrasa, la cola llena frena las descargas.
+    """
+
+    def __init__(self, writer, frontier, site_url=None, concurrency=None, rate=None, burst=None, max_rate=None, ad_index=None, claims=None, record_overrides=None, archive=None, parse_workers=None, http_cache=None, mode=None, metrics_path=None, duplicates=None, geo_index=None, session_count=None, translate_comments=True, emit_removed=True):
+        site_url = config.site_url if site_url is None else site_url
+        concurrency = config.max_concurrency if concurrency is None else concurrency
+        rate = config.requests_per_second if rate is None else rate
+        burst = config.burst_size if burst is None else burst
+        max_rate = config.max_requests_per_second if max_rate is None else max_rate
+        parse_workers = config.parse_workers if parse_workers is None else parse_workers
+        mode = config.crawl_mode if mode is None else mode
+        session_count = config.session_count if session_count is None else session_count
+        self.writer = writer
+        self.session_count = session_count
+        self.translate_comments = translate_comments
+        self.emit_removed = emit_removed
+        self.geo_index = geo_index
+        self.duplicates = duplicates
+        self.metrics_path = metrics_path
+        self.reporter = None
+        self.total_results = None
+        self.http_cache = http_cache
+        self.parse_workers = parse_workers
+        self.mode = mode
+        self.parse_queue = None
+        self.parsers = []
+        self.pool = None
+        self.archive = archive
+        self.frontier = frontier
+        self.ad_index = ad_index
+        self.claims = claims
+        self.record_overrides = record_overrides or {}
+        self.cards = {}
+        self.site_url = site_url.rstrip('/')
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.buckets = {}
+        self.semaphore = None
+        self.sessions = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.sessions = SessionPool(self.session_count)
+        self.parse_queue = asyncio.Queue(maxsize=config.parse_queue_size)
+        if self.parse_workers:
+            self.pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        self.parsers = [asyncio.create_task(self.parse_worker()) for _ in range(max(1, self.parse_workers))]
+        self.reporter = asyncio.create_task(self.report_metrics())
+        await asyncio.gather(*(self.accept_cookies(session) for session in self.sessions.sessions))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.reporter.cancel()
+        await asyncio.gather(self.reporter, return_exceptions=True)
+        self.export_metrics()
+        for task in self.parsers:
+            task.cancel()
+        await asyncio.gather(*self.parsers, return_exceptions=True)
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        await self.sessions.close()
+
+    async def report_metrics(self):
+        """Cada `metrics_interval` segundos registra la línea de progreso y exporta las métricas."""
+        while True:
+            await asyncio.sleep(config.metrics_interval)
+            logger.info(metrics.progress(self.total_results))
+            self.export_metrics()
+
+    def export_metrics(self):
+        if self.metrics_path:
+            try:
+                metrics.export(self.metrics_path)
+            except OSError as e:
+                logger.warning(f"No se pudieron exportar las métricas a {self.metrics_path}: {e}")
+
+    async def run_cpu(self, function, *args):
+        """Ejecuta trabajo de CPU en el pool de procesos, o en un hilo si no hay pool."""
+        if self.pool is None:
+            return await asyncio.to_thread(function, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+    async def parse_worker(self):
+        """Toma fichas de la cola y las extrae en el pool, entregando el resultado a quien la descargó."""
+        while True:
+            property_url, html, future = await self.parse_queue.get()
+            try:
+                # Con detección de duplicados se traduce después, solo si el anuncio no es duplicado
+                result, delta = await self.run_cpu(extract_html_measured, html, config.extraction_mode, property_url,
+                                                   self.pool is not None, self.translate_comments and self.duplicates is None)
+                if delta:
+                    metrics.merge(delta)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.parse_queue.task_done()
+
+    def bucket_for(self, url):
+        """Devuelve el limitador adaptativo del host de la URL."""
+        host = urlparse.urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = AdaptiveRateLimiter(self.rate, self.burst, max_rate=self.max_rate)
+        return self.buckets[host]
+
+    async def fetch(self, url, session=None):
+        """
+        Descarga una URL respetando el presupuesto del host y el límite de concurrencia.
+        Reintenta con espera exponencial los errores de red, 5xx, 429/403 y páginas de
+        bloqueo, hasta `max_fetch_retries` veces; los demás 4xx fallan directamente.
+        Sin `session`, cada intento usa la sesión que asigne el pool; una sesión
+        bloqueada cambia de identidad y repite la aceptación de cookies.
+        Con caché HTTP, una copia vigente se devuelve sin red y una caducada se revalida.
+        """
+        cached = self.http_cache.lookup(url) if self.http_cache is not None else None
+        if cached and cached[1]:
+            self.http_cache.hits += 1
+            metrics.count("http_cache_hits")
+            return cached[0]
+        validators = cached[2] if cached else {}
+
+        limiter = self.bucket_for(url)
+        for attempt in range(config.max_fetch_retries + 1):
+            current = session or self.sessions.acquire()
+            if session is not None:
+                current.in_flight += 1
+            try:
+                if current.needs_warm_up and session is None:
+                    await self.accept_cookies(current)
+                await limiter.acquire()
+                async with self.semaphore:
+                    # La latencia se mide desde que sale la petición, sin la espera por el semáforo
+                    start = time.monotonic()
+                    with metrics.timer("fetch"):
+                        response = await current.client.get(url, headers=validators, timeout=config.request_timeout)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+                metrics.count("fetch_errors", kind=type(e).__name__)
+                limiter.throttle()
+            else:
+                status = response.status_code
+                metrics.count("responses", status=status, kind=url_class(url))
+                if status == 304 and cached:
+                    limiter.reward(time.monotonic() - start)
+                    self.http_cache.refresh(url)
+                    return cached[0]
+                if status in config.throttle_statuses or (status == 200 and is_block_page(response.text)):
+                    error = f"bloqueo (HTTP {status})"
+                    limiter.throttle(retry_after_seconds(response))
+                    current.rotate()
+                elif status >= 500:
+                    error = f"HTTP {status}"
+                    limiter.throttle()
+                elif status >= 400:
+                    raise FetchError(f"HTTP {status} en {url}")
+                else:
+                    limiter.reward(time.monotonic() - start)
+                    if self.http_cache is not None and status == 200:
+                        self.http_cache.store(url, response)
+                    return response.text
+            finally:
+                current.in_flight -= 1
+
+            if attempt < config.max_fetch_retries:
+                delay = backoff_delay(attempt)
+                metrics.count("retries")
+                logger.warning(f"Reintentando {url} en {delay:.1f}s ({error})")
+                await asyncio.sleep(delay)
+        raise FetchError(f"{url}: {error} tras {config.max_fetch_retries + 1} intentos")
+
+    async def accept_cookies(self, session):
+        """Simula la aceptación de cookies inicial de una sesión."""
+        session.needs_warm_up = False
+        await self.fetch(f"{self.site_url}/", session)
+
+    async def scrape_detail(self, property_url):
+        """Descarga una ficha y la encola para su extracción; espera a que el pool la procese."""
+        logger.debug(f"Extrayendo datos de: {property_url}")
+        html = await self.fetch(property_url)
+        if self.archive is not None:
+            self.archive.store(property_url, html, "detail")
+        future = asyncio.get_running_loop().create_future()
+        await self.parse_queue.put((property_url, html, future))
+        record = await future
+        if self.duplicates is not None:
+            await self.resolve_duplicate(record)
+        return record
+
+    async def resolve_duplicate(self, record):
+        """Marca el registro como duplicado de un anuncio ya visto o, si es original, lo traduce e indexa."""
+        original = self.duplicates.match(record)
+        if original is not None:
+            metrics.count("duplicates")
+            record["duplicateOf"] = original
+            return
+        # Se indexa antes de esperar a la traducción para que las copias del mismo lote lo encuentren;
+        # la traducción conserva el comentario original, del que sale la huella
+        self.duplicates.add(record)
+        comments = record.get("comments")
+        if comments:
+            record["comments"], delta = await self.run_cpu(translate_measured, comments[0]["propertyComment"], self.pool is not None)
+            if delta:
+                metrics.merge(delta)
+
+    async def scrape_details(self, property_urls):
+        """Descarga y extrae varias fichas en paralelo y anota el resultado en la frontera."""
+        results = await asyncio.gather(
+            *(self.scrape_detail(property_url) for property_url in property_urls),
+            return_exceptions=True,
+        )
+        fetched = []
+        for property_url, result in zip(property_urls, results):
+            if isinstance(result, Exception):
+                metrics.count("detail_errors")
+                logger.error(f"Error al extraer {property_url}: {result}")
+                self.cards.pop(property_url, None)
+                self.frontier.detail_failed(property_url, str(result))
+                continue
+            self.write_record(property_url, result)
+            fetched.append(property_url)
+        # Los registros llegan al fichero antes de marcarlos como descargados
+        self.writer.flush()
+        if self.geo_index is not None:
+            self.geo_index.commit()
+        self.frontier.details_done(fetched)
+
+    def write_record(self, property_url, record):
+        """Escribe el registro completo o, en modo incremental, el delta correspondiente."""
+        record.update(self.record_overrides)
+        metrics.count("ads", source=record.get("source", "detail"))
+        if self.geo_index is not None:
+            self.geo_index.add(record)
+        with metrics.timer("write"):
+            if self.ad_index is None:
+                self.writer.write(record)
+                return
+            card = self.cards.pop(property_url, None) or {"adid": adid_from_url(property_url), "fingerprint": None}
+            change = self.ad_index.update(card["adid"], property_url, card["fingerprint"], record)
+            if change:
+                metrics.count("changes", change=change)
+                self.writer.write({"change": change, "adid": card["adid"], "record": record})
+
+    async def fetch_listing(self, page_url):
+        """Descarga y analiza una página de listado una sola vez."""
+        html = await self.fetch(page_url)
+        if self.archive is not None:
+            self.archive.store(page_url, html, "listing")
+        with metrics.timer("parse"):
+            return await self.run_cpu(parse_listing, html, page_url)
+
+    async def scrape_page(self, listing, page):
+        """Extrae en paralelo las propiedades pendientes de un listado ya analizado."""
+        cards = listing["cards"]
+        if self.claims is not None:
+            cards = self.claims.claim(cards)
+        if self.ad_index is not None:
+            cards = self.ad_index.select_changed(cards)
+
+        property_urls = [f"{self.site_url}{card['href']}" for card in cards]
+        if self.ad_index is not None:
+            # Solo el modo incremental necesita la tarjeta al escribir; se suelta al escribir o fallar
+            self.cards.update(zip(property_urls, cards))
+        if self.mode != "detail":
+            # Los anuncios que no necesitan ficha se guardan con lo que muestra la tarjeta; los que la
+            # frontera ya conoce se guardaron (o quedaron pendientes) en una pasada anterior de la página
+            known = self.frontier.known_details(property_urls)
+            detail_urls, card_urls = [], []
+            for property_url, card in zip(property_urls, cards):
+                if property_url in known:
+                    self.cards.pop(property_url, None)
+                    continue
+                record = card_record(card, property_url)
+                if self.mode == "hybrid" and needs_detail(record):
+                    detail_urls.append(property_url)
+                else:
+                    self.write_record(property_url, record)
+                    card_urls.append(property_url)
+            self.writer.flush()
+            self.frontier.cards_done(page, card_urls)
+            property_urls = detail_urls
+        self.frontier.add_details(page, property_urls)
+        await self.scrape_details(self.frontier.pending_details(page))
+
+    def finish_listing(self):
+        """Al completar el listado, en modo incremental emite las bajas (los shards las dejan al proceso principal)."""
+        if self.ad_index is None or not self.emit_removed:
+            return
+        removed = self.ad_index.mark_removed()
+        for adid in removed:
+            self.writer.write({"change": "removed", "adid": adid, "record": None})
+        if self.geo_index is not None:
+            self.geo_index.remove(removed)
+        logger.info(f"{len(removed)} anuncios retirados desde la última ejecución.")
+
+    async def crawl(self, base_url):
+        """Recorre la paginación del listado, continuando donde lo dejó la ejecución anterior."""
+        pending = self.frontier.pending_details()
+        if pending:
+            logger.info(f"Reintentando {len(pending)} fichas pendientes de la ejecución anterior...")
+            await self.scrape_details(pending)
+
+        resume_point = self.frontier.resume_point(f"{base_url}?pagina=1")
+        if resume_point is None:
+            logger.info("El listado ya se recorrió por completo.")
+            return
+        page, paginated_url = resume_point
+
+        # La página siguiente se descarga mientras se procesan las fichas de la actual
+        listing_task = asyncio.create_task(self.fetch_listing(paginated_url))
+        try:
+            while True:
+                logger.info(f"Procesando página {page}...")
+                try:
+                    listing = await listing_task
+                    if page == 1 and listing["total_results"] is not None:
+                        self.total_results = listing["total_results"]
+                        logger.info(f"Resultados anunciados: {listing['total_results']}")
+                    next_url = listing["next_url"]
+                    if next_url == paginated_url:
+                        next_url = None
+                    if next_url:
+                        listing_task = asyncio.create_task(self.fetch_listing(next_url))
+                    await self.scrape_page(listing, page)
+                except Exception as e:
+                    metrics.count("page_errors")
+                    logger.error(f"Error en la página {page}: {e}")
+                    self.frontier.page_failed(page, paginated_url, str(e))
+                    break
+
+                self.frontier.page_done(page, paginated_url, next_url)
+                metrics.count("pages")
+                if not next_url:
+                    logger.info("No hay más páginas disponibles.")
+                    self.finish_listing()
+                    break
+
+                page += 1
+                paginated_url = next_url
+        finally:
+            if not listing_task.done():
+                listing_task.cancel()
+
+async def crawl(writer, frontier, base_url=None, site_url=None, concurrency=None, rate=None, ad_index=None, archive=None, http_cache=None, mode=None, duplicates=None, geo_index=None):
+    base_url = config.base_url if base_url is None else base_url
+    site_url = config.site_url if site_url is None else site_url
+    concurrency = config.max_concurrency if concurrency is None else concurrency
+    rate = config.requests_per_second if rate is None else rate
+    mode = config.crawl_mode if mode is None else mode
+    async with AsyncCrawler(writer, frontier, site_url, concurrency=concurrency, rate=rate, ad_index=ad_index, archive=archive, http_cache=http_cache, mode=mode, metrics_path=config.metrics_file, duplicates=duplicates, geo_index=geo_index) as crawler:
+        await crawler.crawl(base_url)
+
+async def fetch_ads(targets, translate_comments=True):
+    """
+    Descarga y extrae fichas sueltas, por adid o por URL, sin frontera ni fichero de salida.
+    Usa una sola sesión y extrae en hilos, sin pool de procesos: es el camino corto para
+    volver a comprobar unos pocos anuncios. Devuelve un registro o la excepción por ficha.
+    """
+    urls = [f"{config.site_url}/inmueble/{target}/" if target.isdigit() else target for target in targets]
+    async with AsyncCrawler(None, None, config.site_url, parse_workers=0, metrics_path=None, session_count=1,
+                            translate_comments=translate_comments) as crawler:
+        return await asyncio.gather(*(crawler.scrape_detail(url) for url in urls), return_exceptions=True)
+
+def run_crawl():
+    """Rastreo completo según la configuración: por shards o un único listado reanudable."""
+    if config.sharded:
+        from .shards import crawl_sharded
+        count = crawl_sharded()
+        logger.info(f"{count} {'cambios' if config.incremental else 'anuncios'} guardados en {config.output_file}")
+        if config.legacy_output_file and not config.incremental:
+            write_json_array(config.output_file, config.legacy_output_file, config.output_compression)
+        if config.parquet_output_dir:
+            write_parquet(config.output_file, config.parquet_output_dir, config.output_compression)
+        return
+
+    # Reanudar la ejecución anterior si quedó a medias; si terminó, empezar de cero
+    frontier = CrawlFrontier(config.frontier_file)
+    if frontier.is_complete():
+        frontier.reset()
+    resuming = frontier.has_progress()
+    if resuming:
+        logger.info(f"Reanudando el rastreo desde {config.frontier_file}")
+
+    # En modo incremental solo se escriben los deltas frente a la ejecución anterior
+    ad_index = None
+    if config.incremental:
+        ad_index = AdIndex(config.ad_index_file)
+        ad_index.begin_run(resuming)
+
+    archive = PageArchive(config.archive_dir) if config.archive_pages else None
+    http_cache = HttpCache(config.http_cache_file) if config.use_http_cache else None
+    duplicates = DuplicateIndex(config.duplicate_index_file) if config.detect_duplicates else None
+    geo_index = GeoIndex(config.geo_index_file) if config.build_geo_index else None
+
+    # Guardar resultados a medida que se extraen
+    with RecordWriter(config.output_file, config.output_compression, append=resuming) as writer:
+        asyncio.run(crawl(writer, frontier, ad_index=ad_index, archive=archive, http_cache=http_cache, mode=config.crawl_mode, duplicates=duplicates, geo_index=geo_index))
+    merge_segments(config.output_file, config.output_compression)
+    frontier.close()
+    if geo_index is not None:
+        geo_index.close()
+    if duplicates is not None:
+        logger.info(f"{metrics.total('duplicates')} anuncios duplicados de otros ya vistos")
+        duplicates.close()
+    if archive is not None:
+        archive.close()
+    if http_cache is not None:
+        stats = http_cache.stats()
+        logger.info(f"Caché HTTP: {stats['hits']} aciertos, {stats['revalidated']} revalidadas (304), {stats['misses']} fallos")
+        http_cache.close()
+    if ad_index is not None:
+        ad_index.close()
+    logger.info(metrics.progress())
+    logger.info(f"{writer.count} {'cambios' if config.incremental else 'anuncios'} guardados en {config.output_file}")
+
+    if config.legacy_output_file and not config.incremental:
+        write_json_array(config.output_file, config.legacy_output_file, config.output_compression)
+        logger.info(f"Datos guardados en {config.legacy_output_file}")
+    if config.parquet_output_dir:
+        count = write_parquet(config.output_file, config.parquet_output_dir, config.output_compression)
+        logger.info(f"{count} registros exportados a las tablas Parquet de {config.parquet_output_dir}")
+
+    hits, misses = metrics.total("translation_cache_hits"), metrics.total("translation_cache_misses")
+    if hits or misses:
+        logger.info(f"Caché de traducciones: {hits} aciertos, {misses} fallos")
@@ -0,0 +1,810 @@
+"""Extracción de los datos de una ficha. Importarlo no abre sesiones, cachés ni ficheros."""
+from bs4 import BeautifulSoup, Tag, NavigableString, CData
+import json
+import time
+from datetime import datetime, timedelta
+import re
+import urllib.parse as urlparse
+
+from . import config
+from .metrics import metrics, process_metrics, field_error, field_missing
+from .translate import translate_comment
+
+# Patrones usados por los extractores
+utag_data_pattern = re.compile(r'var utag_data = ({.*});')
+energy_icon_pattern = re.compile(r'icon-energy-c-[a-g]')
+visit3d_pattern = re.compile(r'visit3DTour:\s*(\[\{.*?\}\])', re.DOTALL)
+recommendation_pattern = re.compile(r'hasToShowRecommendations:\s*(true|false)', re.IGNORECASE)
+modification_date_pattern = re.compile(r"Anuncio actualizado hace (\d+) (día|días|hora|horas|minuto|minutos)")
+offer_text = "Hacer una contraoferta"
+image_size_pattern = re.compile(r'(/blur/)([A-Za-z0-9_-]+)(/)')
+gallery_image_pattern = re.compile(r'id\.pro\.es\.image\.master/')
+adid_pattern = re.compile(r'/inmueble/(\d+)')
+
+def make_soup(html, backend=None):
+    """
+    Construye el árbol BeautifulSoup sobre el que trabajan los extract_*.
+    Con "selectolax" solo los listados usan el motor en C; las fichas se parsean con lxml.
+    """
+    backend = backend or config.parser_backend
+    if backend not in config.parser_backends:
+        raise ValueError(f"Backend de parseo desconocido: {backend}")
+    return BeautifulSoup(html, "lxml" if backend == "selectolax" else backend)
+
+def adid_from_url(url):
+    """Obtiene el identificador del anuncio de una URL /inmueble/<adid>/."""
+    match = adid_pattern.search(url or "")
+    return match.group(1) if match else None
+
+def extract_lat_lon(map_url):
+    """Extrae latitud y longitud desde la URL del mapa."""
+    try:
+        query = urlparse.urlparse(map_url).query
+        params = urlparse.parse_qs(query)
+        center = params.get('center', [None])[0]
+        if center:
+            lat, lon = map(float, center.split(','))
+            return lat, lon
+        return None, None
+    except Exception as e:
+        field_error("coordinates", f"Error al extraer lat/lon: {e}")
+        return None, None
+
+def extract_administrative_areas(soup):
+    """Extrae áreas administrativas desde el bloque de ubicación."""
+    return parse_administrative_areas(soup.find('div', id='headerMap'))
+
+def parse_administrative_areas(header_map):
+    """Convierte el bloque headerMap (o None) en el diccionario de áreas administrativas."""
+    try:
+        area_list = header_map.find_all('li', class_='header-map-list') if header_map else []
+        areas = [area.get_text(strip=True) for area in area_list]
+
+        return {
+            "administrativeAreaLevel4": areas[0] if len(areas) > 0 else None,
+            "administrativeAreaLevel3": areas[1] if len(areas) > 1 else None,
+            "administrativeAreaLevel2": areas[2] if len(areas) > 2 else None,
+            "administrativeAreaLevel1": areas[3] if len(areas) > 3 else None,
+        }
+    except Exception as e:
+        field_error("administrativeAreas", f"Error al extraer áreas administrativas: {e}")
+        return {}
+
+def extract_utag_data(soup):
+    """Extrae datos avanzados desde el objeto utag_data en el JavaScript embebido."""
+    try:
+        script_tag = soup.find('script', string=re.compile(r'var utag_data ='))
+        if not script_tag:
+            return {}
+        return parse_utag_data(script_tag.string)
+    except Exception as e:
+        field_error("utagData", f"Error al extraer utag_data: {e}")
+        return {"ubication": {}, "moreCharacteristics": {}}
+
+def parse_utag_data(script_content):
+    """Decodifica el objeto utag_data a partir del contenido del script que lo declara."""
+    try:
+        json_data_match = utag_data_pattern.search(script_content)
+        if not json_data_match:
+            return {}
+
+        return utag_record(json.loads(json_data_match.group(1)))
+    except Exception as e:
+        field_error("utagData", f"Error al extraer utag_data: {e}")
+        return {"ubication": {}, "moreCharacteristics": {}}
+
+def utag_record(utag_data):
+    """Traduce el objeto utag_data ya decodificado a los campos del registro."""
+    ad_data = utag_data.get('ad', {})
+    characteristics = ad_data.get('characteristics', {})
+    condition = ad_data.get('condition', {})
+
+    return {
+        "ubication": {
+            "locationId": ad_data.get('address', {}).get('locationId'),
+        },
+        "moreCharacteristics": {
+            "communityCosts": characteristics.get('communityCosts'),
+            "roomNumber": characteristics.get('roomNumber'),
+            "isStudio": bool(int(characteristics.get('isStudio', 0))),
+            "bathNumber": characteristics.get('bathNumber'),
+            "exterior": bool(int(characteristics.get('isExterior', 0))),
+            "housingFurnitures": bool(int(characteristics.get('hasFurniture', 0))),
+            "isPenthouse": bool(int(characteristics.get('isPenthouse', 0))),
+            "energyCertificationType": ad_data.get('energyCertification', {}).get('type'),
+            "swimmingPool": bool(int(characteristics.get('hasSwimmingPool', 0))),
+            "flatLocation": characteristics.get('flatLocation'),
+            "modificationDate": ad_data.get('modificationDate'),
+            "constructedArea": characteristics.get('constructedArea'),
+            "lift": bool(int(characteristics.get('hasLift', 0))),
+            "garden": bool(int(characteristics.get('hasGarden', 0))),
+            "boxroom": bool(int(characteristics.get('hasBoxroom', 0))),
+            "isDuplex": bool(int(characteristics.get('isDuplex', 0))),
+            "floor": characteristics.get('floor'),
+            "status": (
+                "excellent" if condition.get('isNewDevelopment') == "1" else
+                "good" if condition.get('isGoodCondition') == "1" else
+                "bad" if condition.get('isNeedsRenovating') == "1" else None
+            ),
+        },
+        "isSuitableForRecommended": bool(int(ad_data.get('isSuitableForRecommended', 0)))
+    }
+
+def extract_multimedia(soup):
+    """Extrae URLs de imágenes y etiquetas multimedia."""
+    return parse_multimedia(soup.find_all('img', {'src': True}))
+
+def gallery_images(image_tags):
+    """
+    Filtra las imágenes que están dentro de un contenedor de la galería del anuncio.
+    El veredicto de cada nodo recorrido se recuerda, de modo que las imágenes que
+    comparten antepasados no vuelven a subir por el árbol.
+    """
+    verdicts = {}   # id(nodo) -> está dentro de la galería
+    gallery = []
+    for img in image_tags:
+        node, path, inside = img, [], False
+        while node is not None:
+            known = verdicts.get(id(node))
+            if known is not None:
+                inside = known
+                break
+            if node.get('id') in config.gallery_markers or any(name in config.gallery_markers for name in node.get('class') or ()):
+                inside = True
+                break
+            path.append(node)
+            node = node.parent
+        for visited in path:
+            verdicts[id(visited)] = inside
+        if inside:
+            gallery.append(img)
+    return gallery
+
+def image_key(url):
+    """Clave de una imagen independiente de su tamaño: la URL con el segmento de tamaño como {size}."""
+    return image_size_pattern.sub(r'\1{size}\3', url, count=1)
+
+def image_url(key, size=None):
+    """URL de la imagen en la variante de tamaño pedida (las URL sin variantes no cambian)."""
+    size = config.image_size if size is None else size
+    return key.replace("{size}", size)
+
+def full_resolution_url(url):
+    """Resuelve bajo demanda la URL a máxima resolución de una imagen guardada."""
+    return image_url(image_key(url), config.full_image_size)
+
+def with_full_resolution(record):
+    """Copia del registro con sus imágenes a máxima resolución, para quien las pide al leerlo."""
+    multimedia = record.get("multimedia") or {}
+    if not multimedia.get("images"):
+        return record
+    images = [dict(image, url=full_resolution_url(image["url"])) for image in multimedia["images"]]
+    return dict(record, multimedia=dict(multimedia, images=images))
+
+def parse_multimedia(image_tags):
+    """
+    Construye el bloque multimedia a partir de las etiquetas <img> con src. Solo cuenta
+    la galería del anuncio (o, si la página no tiene galería reconocible, las imágenes
+    del servidor de fotos de anuncios), sin logos, iconos ni píxeles de seguimiento.
+    Las variantes de tamaño de una misma foto se guardan una sola vez, en `image_size`.
+    """
+    multimedia = {
+        "images": [],
+        "videos": []
+    }
+    gallery = gallery_images(image_tags)
+    if not gallery:
+        gallery = [img for img in image_tags if gallery_image_pattern.search(img['src'])]
+    seen = {}
+    for img in gallery:
+        key = image_key(img['src'])
+        if key in seen:
+            # Otra variante de una foto ya vista: solo aporta el enlace si faltaba
+            if not seen[key]["deeplinkUrl"]:
+                seen[key]["deeplinkUrl"] = img.get('data-url', '')
+            continue
+        seen[key] = {
+            "url": image_url(key),
+            "tag": img.get('alt', 'image'),
+            "localizedName": img.get('alt', 'image'),
+            "deeplinkUrl": img.get('data-url', '')
+        }
+        multimedia["images"].append(seen[key])
+    return multimedia
+    
+# def extract_contact_info(soup):
+#     """Extrae la información de contacto del HTML y obtiene los teléfonos a través de una solicitud AJAX."""
+#     contact_info = {
+#         "phone1": {
+#             "phoneNumber": None,
+#             "formattedPhone": None,
+#             "prefix": None,
+#             "phoneNumberForMobileDialing": None,
+#             "nationalNumber": None,
+#             "formattedPhoneWithPrefix": None
+#         },
+#         "phone2": {
+#             "phoneNumber": None,
+#             "formattedPhone": None,
+#             "prefix": None,
+#             "phoneNumberForMobileDialing": None,
+#             "nationalNumber": None,
+#             "formattedPhoneWithPrefix": None
+#         },
+#         "contactName": None,
+#         "userType": None,
+#         "contactMethod": "all",
+#         "sharedSeekerProfile": False,
+#         "totalAds": 0,
+#         "professional": None,
+#         "chatEnabled": None
+#     }
+
+#     # Obtener el data-adid del HTML
+#     adid_tag = soup.find('a', class_='btn nav next icon-arrow-right-after --not-mobile', attrs={'data-adid': True})
+#     if not adid_tag:
+#         print("No se encontró el data-adid en el HTML.")
+#         return contact_info
+
+#     adid = adid_tag['data-adid']
+
+#     # Contact Name
+#     contact_name_tag = soup.find('div', class_='professional-name')
+#     if contact_name_tag:
+#         name_tag = contact_name_tag.find('input', {'name': 'user-name'})
+#         if name_tag:
+#             contact_info["contactName"] = name_tag['value'].strip()
+
+#     # User Type
+#     user_type_tag = soup.find('div', {'data-is-private-user': True})
+#     if user_type_tag:
+#         contact_info["userType"] = "private"
+#         contact_info["professional"] = False
+#     else:
+#         contact_info["userType"] = "professional"
+#         contact_info["professional"] = True
+
+#     # Chat Enabled
+#     chat_tag = soup.find('div', {'data-has-chat-enabled': True})
+#     contact_info["chatEnabled"] = chat_tag is not None
+
+#     # Realizar la solicitud AJAX para obtener los teléfonos utilizando adid
+#     try:
+#         url = f"https://www.idealista.com/es/ajax/ads/{adid}/contact-phones"
+#         response = requests.get(url)
+#         response.raise_for_status()
+#         phones_data = response.json()  # Suponiendo que la respuesta es JSON
+
+#         # Extraer y formatear los teléfonos si existen
+#         if phones_data.get("phone1"):
+#             phone1 = phones_data["phone1"]
+#             contact_info["phone1"] = {
+#                 "phoneNumber": phone1,
+#                 "formattedPhone": f"{phone1[:3]} {phone1[3:5]} {phone1[5:]}",
+#                 "prefix": "34",
+#                 "phoneNumberForMobileDialing": f"+34{phone1}",
+#                 "nationalNumber": True,
+#                 "formattedPhoneWithPrefix": f"+34 {phone1[:3]} {phone1[3:5]} {phone1[5:]}"
+#             }
+
+#         if phones_data.get("phone2"):
+#             phone2 = phones_data["phone2"]
+#             contact_info["phone2"] = {
+#                 "phoneNumber": phone2,
+#                 "formattedPhone": f"{phone2[:3]} {phone2[3:5]} {phone2[5:]}",
+#                 "prefix": "34",
+#                 "phoneNumberForMobileDialing": f"+34{phone2}",
+#                 "nationalNumber": True,
+#                 "formattedPhoneWithPrefix": f"+34 {phone2[:3]} {phone2[3:5]} {phone2[5:]}"
+#             }
+    
+#     except requests.exceptions.RequestException as e:
+#         print(f"Error al realizar la solicitud AJAX: {e}")
+
+#     # Teléfonos (extracción dinámica desde el HTML)
+#     phone1_tag = soup.find('a', href=re.compile(r'tel:\+34'))
+#     if phone1_tag:
+#         phone1 = phone1_tag['href'].replace('tel:', '')
+#         contact_info["phone1"] = {
+#             "phoneNumber": phone1,
+#             "formattedPhone": f"{phone1[:3]} {phone1[3:5]} {phone1[5:]}",
+#             "prefix": "34",
+#             "phoneNumberForMobileDialing": f"+34{phone1}",
+#             "nationalNumber": True,
+#             "formattedPhoneWithPrefix": f"+34 {phone1[:3]} {phone1[3:5]} {phone1[5:]}"
+#         }
+
+#     phone2_tag = soup.find('a', href=re.compile(r'tel:\+34'))
+#     if phone2_tag and phone2_tag != phone1_tag:
+#         phone2 = phone2_tag['href'].replace('tel:', '')
+#         contact_info["phone2"] = {
+#             "phoneNumber": phone2,
+#             "formattedPhone": f"{phone2[:3]} {phone2[3:5]} {phone2[5:]}",
+#             "prefix": "34",
+#             "phoneNumberForMobileDialing": f"+34{phone2}",
+#             "nationalNumber": True,
+#             "formattedPhoneWithPrefix": f"+34 {phone2[:3]} {phone2[3:5]} {phone2[5:]}"
+#         }
+
+#     return contact_info
+
+
+
+def extract_energy_certification(soup):
+    """Extrae los detalles del certificado energetico"""
+    return parse_energy_certification(soup.find('div', class_ = 'details-property-feature-two'))
+
+def parse_energy_certification(energy_features):
+    """Lee los elementos <li> del bloque de certificación energética (o None)."""
+    energy_cerifications = []
+
+    if not energy_features:
+        return []
+    
+    #iterar sobre las caracteristicas energéticas
+    for item in energy_features.find_all('li'):
+        prefix = item.find('span').get_text(strip = True) if item.find('span') else None
+        icon_span = item.find('span', class_ = energy_icon_pattern)
+
+        if icon_span: 
+            suffix = icon_span['class'][0].split('-')[-1].upper()
+            has_icon = True
+        else:
+            suffix = None
+            has_icon = False
+
+        energy_cerifications.append({
+            "prefix": prefix,
+            "suffix": suffix,
+            "hasIcon": has_icon
+        })
+
+    return energy_cerifications
+
+def check_offer_text(soup):
+    """Busca el texto Hacer una contraoferta en todo el HTML de la página"""
+    try: 
+        page_text = soup.get_text()
+        if offer_text in page_text:
+            return True
+        return False
+    except Exception as e: 
+        field_error("allowsCounterOffers", f"Error al buscar el texto de la contraoferta: {e}")
+        return False
+
+def extract_remote_visit_and_360(soup):
+    """
+    Extrae los valores correspondientes a 'allowsRemoteVisit' y 'has360VHS' 
+    a partir del bloque de datos de 'visit3DTour' en el HTML.
+    """
+    script_tag = soup.find('script', string=re.compile(r'visit3DTour'))
+    return parse_remote_visit_and_360(script_tag.string if script_tag else None)
+
+def parse_remote_visit_and_360(script_content):
+    """Interpreta el contenido del script con 'visit3DTour' (o None)."""
+    try:
+        if not script_content:
+            field_missing("visit3DTour", "No se encontró el bloque 'visit3DTour'.")
+            return {"allowsRemoteVisit": False, "has360VHS": False}
+
+        # Buscar la estructura JSON dentro del script
+        json_data_match = visit3d_pattern.search(script_content)
+        if not json_data_match:
+            field_missing("visit3DTour", "No se pudo extraer los datos de 'visit3DTour'.")
+            return {"allowsRemoteVisit": False, "has360VHS": False}
+
+        # Parsear el JSON encontrado
+        return remote_visit_flags(json.loads(json_data_match.group(1)))
+    except Exception as e:
+        field_error("visit3DTour", f"Error al extraer datos de 'visit3DTour': {e}")
+        return {"allowsRemoteVisit": False, "has360VHS": False}
+
+def remote_visit_flags(visit3D_data):
+    """Obtiene los valores de '3d' y '360' del primer elemento de la lista visit3DTour ya decodificada."""
+    if visit3D_data and isinstance(visit3D_data, list):
+        first_entry = visit3D_data[0]
+        allows_remote_visit = first_entry.get("3d", False)
+        has_360_vhs = first_entry.get("360", False)
+
+        return {
+            "allowsRemoteVisit": allows_remote_visit,
+            "has360VHS": has_360_vhs
+        }
+
+    return {"allowsRemoteVisit": False, "has360VHS": False}
+
+def check_mortgage_simluator(soup):
+    """Busca el simulador de hipotecas en el HTML de la página."""
+    simulator_section = soup.find("div", class_="item-form item-redils js-buying-price-slider buying-price")
+    if not simulator_section:
+        return False
+    return True
+
+def extract_allow_recommendation(soup):
+    """
+    Extrae el valor de hasToShowRecommendations desde un script HTML 
+    y lo asigna a allowsRecommendation.
+    """
+    # Busca el <script> que contiene 'hasToShowRecommendations'
+    script_tag = soup.find("script", string=re.compile(r'hasToShowRecommendations'))
+    return parse_allow_recommendation(script_tag.string if script_tag else None)
+
+def parse_allow_recommendation(script_content):
+    """Lee hasToShowRecommendations del contenido del script (o None)."""
+    try:
+        if not script_content:
+            field_missing("allowsRecommendation", "No se encontró el script que contiene 'hasToShowRecommendations'.")
+            return False
+
+        # Busca la estructura JSON que contiene 'hasToShowRecommendations'
+        json_data_match = recommendation_pattern.search(script_content)
+        if not json_data_match:
+            field_missing("allowsRecommendation", "No se encontró 'hasToShowRecommendations' en el script.")
+            return False
+        
+        # Extrae el valor booleano de 'hasToShowRecommendations'
+        has_to_show_recommendations = json_data_match.group(1).lower() == 'true'
+
+        return has_to_show_recommendations
+    except Exception as e:
+        field_error("allowsRecommendation", f"Error al extraer datos de 'hasToShowRecommendations': {e}")
+        return False
+
+def extract_modification_date(soup):
+    """Extrae la información de la última actualización desde el texto del HTML"""
+
+    return parse_modification_date(soup.find(string = modification_date_pattern))
+
+def parse_modification_date(texto_actualizacion):
+    """Convierte el texto "Anuncio actualizado hace N ..." (o None) en fecha de modificación."""
+    try: 
+        if not texto_actualizacion:
+            field_missing("modificationDate", "No se encontró el texto de la última actualización.")
+            return None
+        
+        #extrae el valor númerico y la unidad de tiempo 
+        match = modification_date_pattern.search(texto_actualizacion)
+        if not match:
+            field_missing("modificationDate", "No se pudo extraer la información de la última actualización.")
+            return None
+        
+        cantidad = int(match.group(1))
+        unidad = match.group(2)
+
+        #calcular la fecha de modificación
+        ahora = datetime.now()
+        if "día" in unidad:
+            fecha_actualizacion = ahora - timedelta(days = cantidad)
+        elif "hora" in unidad:
+            fecha_actualizacion = ahora - timedelta(hours = cantidad)
+        elif "minuto" in unidad:
+            fecha_actualizacion = ahora - timedelta(minutes = cantidad)
+        else:
+            field_error("modificationDate", "Unidad de tiempo no reconocida.")
+            return None
+        
+        #convierte la fecha a milisegundos desde la época Unix
+        value =  int(fecha_actualizacion.timestamp() * 1000)
+
+        modification_date = {
+            "value": value,
+            "text": texto_actualizacion.strip()
+        }
+        return modification_date
+    except Exception as e:
+        field_error("modificationDate", f"Error al extraer la fecha de modificación: {e}")
+        return None
+
+# Nodos que busca scan_document: nombre de etiqueta -> [(campo, atributo, valor)]
+scan_targets = {
+    'div': [
+        ("adReference", 'class', 'ad-reference-container'),
+        ("map", 'class', 'map'),
+        ("headerMap", 'id', 'headerMap'),
+        ("comment", 'class', 'comment'),
+        ("energyFeatures", 'class', 'details-property-feature-two'),
+        ("mortgageSimulator", 'class', 'item-form item-redils js-buying-price-slider buying-price'),
+    ],
+    'span': [
+        ("price", 'class', 'info-data-price'),
+        ("locationTitle", 'class', 'main-info__title-minor'),
+    ],
+}
+
+# Scripts que busca scan_document: campo -> texto que identifica el script
+scan_scripts = {
+    "utagData": 'var utag_data =',
+    "visit3DTour": 'visit3DTour',
+    "recommendations": 'hasToShowRecommendations',
+}
+
+# Interpretación del contenido de cada script encontrado en el DOM (o None)
+script_decoders = {
+    "utagData": lambda content: parse_utag_data(content) if content else {},
+    "visit3DTour": parse_remote_visit_and_360,
+    "recommendations": parse_allow_recommendation,
+}
+
+# Bloques JSON que se leen directamente del cuerpo: campo -> (marcador justo antes del JSON, intérprete)
+embedded_blobs = {
+    "utagData": (re.compile(r'var utag_data = (?=\{)'), utag_record),
+    "visit3DTour": (re.compile(r'visit3DTour:\s*(?=\[\{)'), remote_visit_flags),
+}
+json_decoder = json.JSONDecoder()
+
+def scan_embedded(html):
+    """
+    Lee los bloques JSON de los scripts directamente del cuerpo de la respuesta, sin
+    construir el árbol: localiza cada marcador y decodifica con raw_decode solo el valor
+    que empieza ahí. Devuelve {campo: valor ya interpretado} para los que consigue leer;
+    los que faltan se resuelven desde el DOM con script_decoders.
+    """
+    found = {}
+    for field, (pattern, interpret) in embedded_blobs.items():
+        match = pattern.search(html)
+        if match:
+            try:
+                found[field] = interpret(json_decoder.raw_decode(html, match.end())[0])
+            except Exception:
+                pass
+    match = recommendation_pattern.search(html)
+    if match:
+        found["recommendations"] = match.group(1).lower() == 'true'
+    return found
+
+def compile_target(attr, value):
+    """
+    Convierte un selector (atributo, valor) en un predicado que reproduce la comparación
+    de find(): id exacto, o clase que coincide con una de las clases o con la cadena completa.
+    """
+    if attr == 'id':
+        return lambda tag: tag.get('id') == value
+    if " " in value:
+        return lambda tag: " ".join(tag.get('class') or ()) == value
+    return lambda tag: value in (tag.get('class') or ())
+
+# Selectores compilados una sola vez: nombre de etiqueta -> [(campo, predicado)]
+compiled_targets = {
+    name: [(field, compile_target(attr, value)) for field, attr, value in targets]
+    for name, targets in scan_targets.items()
+}
+
+def scan_document(soup, embedded=None):
+    """
+    Recorre el árbol una sola vez y clasifica cada nodo en los campos que alimenta.
+    Devuelve un diccionario con el primer nodo de cada selector, el contenido de los
+    scripts relevantes, las imágenes, el enlace canónico y los textos buscados.
+    Los campos ya leídos con scan_embedded se copian y sus scripts no se buscan.
+    """
+    found = {"images": [], "offerText": False, "modificationText": None, "canonical": None}
+    found.update(embedded or {})
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            name = node.name
+            if name == 'img':
+                if node.has_attr('src'):
+                    found["images"].append(node)
+            elif name == 'script':
+                content = node.string
+                if content:
+                    for field, marker in scan_scripts.items():
+                        if field not in found and marker in content:
+                            found[field] = content
+            elif name == 'link':
+                if found["canonical"] is None and 'canonical' in (node.get('rel') or []):
+                    found["canonical"] = node.get('href')
+            else:
+                for field, matches in compiled_targets.get(name, ()):
+                    if field not in found and matches(node):
+                        found[field] = node
+        else:
+            # Como get_text(), el texto visible excluye scripts, estilos y comentarios
+            if not found["offerText"] and type(node) in (NavigableString, CData) and offer_text in node:
+                found["offerText"] = True
+            if found["modificationText"] is None and modification_date_pattern.search(node):
+                found["modificationText"] = node
+    return found
+
+# --- Registro declarativo de campos ---
+# Cada conversor recibe lo que scan_document encontró para su fuente (o None) y el
+# contexto de la extracción, y devuelve {ruta en el registro: valor}.
+
+def convert_adid(tag, context):
+    adid = tag.find('p', class_='txt-ref') if tag else None
+    return {"adid": adid.get_text(strip=True)} if adid else {}
+
+def convert_price(tag, context):
+    if not tag:
+        return {}
+    price = int(tag.get_text(strip=True).replace('€', '').replace('.', ''))
+    return {"price": price, "priceInfo": {"amount": price, "currencySuffix": "€"}}
+
+def convert_location_title(tag, context):
+    return {"ubication.title": tag.get_text(strip=True)} if tag else {}
+
+def convert_coordinates(tag, context):
+    lat, lon = extract_lat_lon(tag.get('data-url') if tag else None)
+    return {"ubication.latitude": lat, "ubication.longitude": lon}
+
+def convert_utag_data(utag_data, context):
+    values = {f"ubication.{key}": value for key, value in utag_data.get("ubication", {}).items()}
+    values["moreCharacteristics"] = dict(utag_data.get("moreCharacteristics", {}))
+    return values
+
+def convert_comments(tag, context):
+    comment = tag.find('p') if tag else None
+    if not comment:
+        return {}
+    comment_text = comment.get_text(strip=True)
+    if context["translate"]:
+        return {"comments": translate_comment(comment_text)}
+    return {"comments": translate_comment(comment_text, target_languages=[])}
+
+def convert_remote_visit(remote_visit, context):
+    return {"allowsRemoteVisit": remote_visit["allowsRemoteVisit"], "has360VHS": remote_visit["has360VHS"]}
+
+# (campo, fuente en scan_document, conversor), en el orden en que se rellenan
+field_specs = [
+    ("adid", "adReference", convert_adid),
+    ("price", "price", convert_price),
+    ("ubication.title", "locationTitle", convert_location_title),
+    ("ubication.coordinates", "map", convert_coordinates),
+    ("ubication.administrativeAreas", "headerMap",
+        lambda tag, context: {"ubication.administrativeAreas": parse_administrative_areas(tag)}),
+    ("multimedia", "images", lambda images, context: {"multimedia": parse_multimedia(images)}),
+    ("utagData", "utagData", convert_utag_data),
+    ("comments", "comment", convert_comments),
+    ("detailWebLink", "canonical", lambda href, context: {"detailWebLink": href}),
+    ("energyCertification", "energyFeatures",
+        lambda tag, context: {"energyCertification": parse_energy_certification(tag)}),
+    ("allowsCounterOffers", "offerText", lambda found, context: {"allowsCounterOffers": found}),
+    ("remoteVisit", "visit3DTour", convert_remote_visit),
+    ("allowsMortgageSimulator", "mortgageSimulator",
+        lambda tag, context: {"allowsMortgageSimulator": tag is not None}),
+    ("allowsRecommendation", "recommendations",
+        lambda flag, context: {"allowsRecommendation": flag}),
+    ("modificationDate", "modificationText",
+        lambda text, context: {"modificationDate": parse_modification_date(text)}),
+]
+
+# Instrumentación por campo: activar profile_fields acumula llamadas y segundos en field_timings
+profile_fields = False
+field_timings = {}
+
+def record_timing(name, seconds):
+    timing = field_timings.setdefault(name, [0, 0.0])
+    timing[0] += 1
+    timing[1] += seconds
+
+def field_timing_report():
+    """[(campo, llamadas, segundos totales)] ordenado del campo más costoso al menos."""
+    return sorted(((name, calls, seconds) for name, (calls, seconds) in field_timings.items()),
+                  key=lambda timing: timing[2], reverse=True)
+
+def get_path(data, path):
+    """Lee un valor del registro siguiendo una ruta con puntos; None si no existe."""
+    for key in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+def comparable_json(record):
+    """Serializa un registro sin la parte de modificationDate que depende del reloj."""
+    if record.get("modificationDate"):
+        record["modificationDate"] = dict(record["modificationDate"], value=None)
+    return json.dumps(record, ensure_ascii=False, sort_keys=True, indent=4) + "\n"
+
+def set_path(data, path, value):
+    """Asigna un valor en el registro siguiendo una ruta con puntos ("ubication.title")."""
+    keys = path.split(".")
+    target = data
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+def extract_html(html, mode="full", url=None, translate=True):
+    """Parsea y extrae una ficha; se ejecuta en los procesos del pool de extracción."""
+    start = time.perf_counter()
+    embedded = scan_embedded(html)
+    if profile_fields:
+        record_timing("scan_embedded", time.perf_counter() - start)
+    if mode == "lite":
+        return extract_lite(html, embedded, url)
+    return extract_data_from_html(make_soup(html), translate=translate, embedded=embedded)
+
+def extract_html_measured(html, mode=None, url=None, in_pool=False, translate=True):
+    """
+    extract_html para el pool de extracción: anota la etapa "extract" y, si se ejecuta
+    en un proceso del pool, devuelve también las métricas que acumuló ese proceso.
+    """
+    mode = config.extraction_mode if mode is None else mode
+    process_metrics()
+    with metrics.timer("extract"):
+        record = extract_html(html, mode, url, translate)
+    return record, metrics.drain() if in_pool else None
+
+def translate_measured(comment_text, in_pool=False):
+    """translate_comment para el pool de extracción, devolviendo sus métricas como extract_html_measured."""
+    process_metrics()
+    comments = translate_comment(comment_text)
+    return comments, metrics.drain() if in_pool else None
+
+def extract_lite(html, embedded, url=None):
+    """
+    Modo lite: solo los campos de los bloques JSON embebidos (ubicación, moreCharacteristics
+    y los indicadores de visita 3D y recomendaciones), más el adid y el enlace de la URL.
+    El HTML solo se parsea si algún bloque no se pudo leer directamente del cuerpo.
+    """
+    missing = [field for field in script_decoders if field not in embedded]
+    if missing:
+        found = scan_document(make_soup(html), embedded)
+        embedded = dict(embedded, **{field: script_decoders[field](found.get(field)) for field in missing})
+    data = {"adid": adid_from_url(url), "detailWebLink": url, "ubication": {}}
+    for name, source, convert in field_specs:
+        if source in script_decoders:
+            for path, value in convert(embedded[source], {}).items():
+                set_path(data, path, value)
+    return data
+
+def extract_data_from_html(soup, translate=True, embedded=None):
+    """
+    Extrae los datos necesarios del HTML y los organiza según idealista.json.
+    Con translate=False los comentarios se guardan solo en el idioma original.
+    embedded son los bloques JSON ya leídos del cuerpo con scan_embedded, si los hay.
+    """
+    data = {
+        "adid": None,
+        "price": None,
+        "priceInfo": {  "amount": None, 
+                        "currencySuffix": None},
+        "operation": "sale",
+        "propertyType": "homes",
+        "state": "active",
+        "multimedia": { "images": [], 
+                        "videos": []},
+        "propertyComment": None,
+        "ubication": {  "title": None, 
+                        "latitude": None, 
+                        "longitude": None, 
+                        "administrativeAreas": {}}, #falta el hasHidenAddress, administrativeAreaLevel1Id, locationName
+        "country": "ES",
+        # "contactInfo": {},   //testear
+        "moreCharacteristics": {}, 
+        #translatedText (floorNumberDescription, layoutDescription, characteristicsDescriptions {key, title, phrases}) //corroborar con cliente si es necesario o no este elemento, ya que no se traduce nada de lo que existe aqui a
+        #suggestedTexts (title) //no exsite dentro del html
+        #detailedType (typology, subTypology) //no existe dentro del html
+        "comments": [], 
+        "detailWebLink": None,
+        "energyCertification": [],
+        "allowsCounterOffers": False,
+        "allowsRemoteVisit": False, 
+        "allowsMortgageSimulator": False,
+        "allowsProfileQualification": False,
+        "tracking": { "isSuitableForRecommended": False,
+        },
+        "has360VHS": False,
+        #labels //no existe en el HTML 
+        #showSuggestedPrice //no existe dentro del html
+        "allowsRecommendation": False, 
+        "modificationDate": [],
+    }
+
+    # Un único recorrido del documento y después cada campo declarado en field_specs
+    start = time.perf_counter()
+    embedded = embedded or {}
+    found = scan_document(soup, embedded)
+    for field, decode in script_decoders.items():
+        if field not in embedded:
+            found[field] = decode(found.get(field))
+    if profile_fields:
+        record_timing("scan_document", time.perf_counter() - start)
+
+    context = {"translate": translate}
+    for name, source, convert in field_specs:
+        start = time.perf_counter()
+        for path, value in convert(found.get(source), context).items():
+            set_path(data, path, value)
+        if profile_fields:
+            record_timing(name, time.perf_counter() - start)
+    return data
@@ -0,0 +1,173 @@
+"""Índice geoespacial por geohash y sus consultas."""
+import math
+import sqlite3
+
+from . import config
+from .output import iter_records, as_number
+from .store import distance_meters
+
+geohash_alphabet = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash(latitude, longitude, precision=None):
+    """Codifica unas coordenadas como geohash de `precision` caracteres."""
+    precision = config.geohash_precision if precision is None else precision
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    code, bits, value, even = [], 0, 0, True
+    while len(code) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            code.append(geohash_alphabet[value])
+            bits, value = 0, 0
+    return "".join(code)
+
+def geohash_cell_size(precision):
+    """(alto, ancho) en grados de una celda de geohash de `precision` caracteres."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def covering_geohashes(south, west, north, east, max_cells=32):
+    """
+    Prefijos de geohash que cubren el rectángulo: la precisión más fina con la que
+    bastan como mucho `max_cells` celdas.
+    """
+    for precision in range(config.geohash_precision, 0, -1):
+        height, width = geohash_cell_size(precision)
+        rows, columns = math.ceil((north - south) / height) + 1, math.ceil((east - west) / width) + 1
+        if rows * columns <= max_cells or precision == 1:
+            break
+    cells = set()
+    for row in range(rows + 1):
+        latitude = min(south + row * height, north)
+        for column in range(columns + 1):
+            cells.add(geohash(latitude, min(west + column * width, east), precision))
+    return sorted(cells)
+
+class GeoIndex:
+    """
+    Índice geoespacial persistente (SQLite) de los anuncios, alimentado a medida que se
+    escriben. Cada anuncio guarda su geohash; las búsquedas por radio o rectángulo
+    recorren solo los rangos del índice de los prefijos que cubren la zona y después
+    filtran con las coordenadas exactas. Las áreas administrativas están indexadas
+    para agregar por municipio, provincia, etc. Los duplicados no se indexan.
+    """
+    columns = ("adid", "geohash", "latitude", "longitude", "price", "area", "rooms",
+               "level1", "level2", "level3", "level4", "title", "url")
+
+    def __init__(self, path=None):
+        path = config.geo_index_file if path is None else path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            "adid TEXT PRIMARY KEY, geohash TEXT, latitude REAL, longitude REAL, price INTEGER, area REAL, "
+            "rooms INTEGER, level1 TEXT, level2 TEXT, level3 TEXT, level4 TEXT, title TEXT, url TEXT);"
+            "CREATE INDEX IF NOT EXISTS listings_geohash ON listings (geohash);"
+            "CREATE INDEX IF NOT EXISTS listings_level1 ON listings (level1);"
+            "CREATE INDEX IF NOT EXISTS listings_level2 ON listings (level2);"
+            "CREATE INDEX IF NOT EXISTS listings_level3 ON listings (level3);"
+            "CREATE INDEX IF NOT EXISTS listings_level4 ON listings (level4);"
+        )
+        self.db.commit()
+        self.pending = 0
+
+    def add(self, record):
+        """Indexa (o actualiza) un registro con coordenadas; los demás se ignoran."""
+        ubication = record.get("ubication") or {}
+        latitude, longitude = ubication.get("latitude"), ubication.get("longitude")
+        if not record.get("adid") or latitude is None or longitude is None or record.get("duplicateOf"):
+            return
+        areas = ubication.get("administrativeAreas") or {}
+        characteristics = record.get("moreCharacteristics") or {}
+        self.db.execute(
+            f"INSERT OR REPLACE INTO listings VALUES ({','.join('?' * len(self.columns))})",
+            (record["adid"], geohash(latitude, longitude), latitude, longitude,
+             as_number(record.get("price"), int), as_number(characteristics.get("constructedArea"), float),
+             as_number(characteristics.get("roomNumber"), int),
+             areas.get("administrativeAreaLevel1"), areas.get("administrativeAreaLevel2"),
+             areas.get("administrativeAreaLevel3"), areas.get("administrativeAreaLevel4"),
+             ubication.get("title"), record.get("detailWebLink")),
+        )
+        self.pending += 1
+        if self.pending >= 100:
+            self.commit()
+
+    def remove(self, adids):
+        self.db.executemany("DELETE FROM listings WHERE adid = ?", [(adid,) for adid in adids])
+        self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def in_cells(self, cells, where="", params=()):
+        """Filas de los prefijos de geohash dados que cumplen la condición adicional."""
+        ranges = " OR ".join("(geohash >= ? AND geohash < ?)" for _ in cells)
+        bounds = [bound for cell in cells for bound in (cell, cell + "~")]
+        return self.db.execute(f"SELECT * FROM listings WHERE ({ranges}){where}", bounds + list(params)).fetchall()
+
+    def bbox(self, south, west, north, east):
+        """Anuncios dentro del rectángulo (grados)."""
+        rows = self.in_cells(covering_geohashes(south, west, north, east),
+                             " AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?", (south, north, west, east))
+        return [dict(row) for row in rows]
+
+    def radius(self, latitude, longitude, kilometers, limit=None):
+        """Anuncios a menos de `kilometers` del punto, del más cercano al más lejano, con su distancia."""
+        # Rectángulo que contiene el casquete esférico, con el mismo radio terrestre que distance_meters
+        angle = kilometers / 6371
+        delta_lat = math.degrees(angle)
+        delta_lon = math.degrees(math.asin(min(1.0, math.sin(angle) / max(math.cos(math.radians(latitude)), 1e-9))))
+        results = []
+        for row in self.bbox(latitude - delta_lat, longitude - delta_lon, latitude + delta_lat, longitude + delta_lon):
+            distance = distance_meters(latitude, longitude, row["latitude"], row["longitude"]) / 1000
+            if distance <= kilometers:
+                row["distance_km"] = distance
+                results.append(row)
+        results.sort(key=lambda row: row["distance_km"])
+        return results[:limit] if limit else results
+
+    def aggregate(self, level=2, **filters):
+        """
+        Número de anuncios, precio medio y precio medio por m² de cada área del nivel
+        administrativo dado (1: comunidad ... 4: barrio), con filtros de igualdad
+        sobre otros niveles (p. ej. level1="Andalucía").
+        """
+        where = " AND ".join(f"{column} = ?" for column in filters if column in self.columns)
+        rows = self.db.execute(
+            f"SELECT level{int(level)} AS area, COUNT(*) AS listings, AVG(price) AS avg_price, "
+            f"AVG(CASE WHEN area > 0 THEN price / area END) AS avg_price_m2 FROM listings "
+            f"{'WHERE ' + where if where else ''} GROUP BY level{int(level)} ORDER BY listings DESC",
+            [value for column, value in filters.items() if column in self.columns],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+def build_geo_index_from(ndjson_path, path=None, compression=None):
+    """Construye (o completa) el índice geoespacial a partir de una salida NDJSON."""
+    path = config.geo_index_file if path is None else path
+    index = GeoIndex(path)
+    count = 0
+    for item in iter_records(ndjson_path, compression):
+        if "change" in item and "record" in item:
+            if item["change"] == "removed":
+                index.remove([item["adid"]])
+                continue
+            item = item["record"]
+        index.add(item)
+        count += 1
+    index.close()
+    return count
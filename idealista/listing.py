@@ -0,0 +1,134 @@
+"""Análisis de las páginas de listado y de sus tarjetas de anuncio."""
+import hashlib
+import re
+import urllib.parse as urlparse
+
+from . import config
+from .extract import make_soup, adid_from_url, get_path
+
+total_results_pattern = re.compile(r'\d{1,3}(?:\.\d{3})+|\d+')
+card_rooms_pattern = re.compile(r'(\d+)\s*hab')
+card_area_pattern = re.compile(r'(\d[\d.]*)\s*m²')
+
+def make_card(href, adid, card_text, title=None, price=None, details=(), thumbnail=None):
+    """
+    Tarjeta de un anuncio del listado: href, adid y huella de su contenido visible, más
+    los textos que muestra (título, precio, características y miniatura) para card_record.
+    """
+    return {
+        "href": href,
+        "adid": adid or adid_from_url(href),
+        "fingerprint": hashlib.sha256(" ".join(card_text.split()).encode("utf-8")).hexdigest(),
+        "title": title,
+        "price": price,
+        "details": list(details),
+        "thumbnail": thumbnail,
+    }
+
+def card_record(card, property_url):
+    """Registro parcial construido solo con lo que muestra la tarjeta del listado."""
+    digits = "".join(ch for ch in card["price"] or "" if ch.isdigit())
+    price = int(digits) if digits else None
+    rooms = area = None
+    for detail in card["details"]:
+        rooms_match = card_rooms_pattern.search(detail)
+        area_match = card_area_pattern.search(detail)
+        if rooms is None and rooms_match:
+            rooms = rooms_match.group(1)
+        if area is None and area_match:
+            area = area_match.group(1).replace('.', '')
+    return {
+        "adid": card["adid"],
+        "price": price,
+        "priceInfo": {"amount": price, "currencySuffix": "€" if price is not None else None},
+        "multimedia": {"images": [{"url": card["thumbnail"], "tag": "thumbnail"}] if card["thumbnail"] else [],
+                       "videos": []},
+        "ubication": {"title": card["title"]},
+        "moreCharacteristics": {"roomNumber": rooms, "constructedArea": area},
+        "detailWebLink": property_url,
+        "source": "card",
+    }
+
+def needs_detail(record, filters=None, required=None):
+    """
+    Modo hybrid: la ficha hace falta si a la tarjeta le falta algún campo obligatorio
+    o si el anuncio cae dentro de los rangos de filters. Si la tarjeta no trae el campo
+    de un filtro no se puede descartar el anuncio, así que también se descarga.
+    """
+    required = config.required_card_fields if required is None else required
+    if any(get_path(record, path) is None for path in required):
+        return True
+    for path, (low, high) in (config.hybrid_filters if filters is None else filters).items():
+        value = get_path(record, path)
+        if value is None:
+            return True
+        value = float(value)
+        if (low is None or value >= low) and (high is None or value <= high):
+            return True
+    return False
+
+def parse_total_results(title):
+    """Lee el total de anuncios del título del listado ("1.234 casas y pisos ...")."""
+    match = total_results_pattern.search(title or "")
+    return int(match.group(0).replace('.', '')) if match else None
+
+def parse_listing(html, page_url=None, backend=None):
+    """
+    Analiza una página de listado en un solo parseo. Devuelve un diccionario con las
+    tarjetas de anuncios, la URL de la página siguiente (None si es la última) y el
+    total de resultados que anuncia el título.
+    """
+    backend = backend or config.parser_backend
+    cards = []
+    if backend == "selectolax":
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError:
+            raise ImportError("El backend 'selectolax' requiere el paquete selectolax") from None
+        tree = LexborHTMLParser(html)
+        for node in tree.css('a.item-link'):
+            href = node.attributes.get('href')
+            if not href:
+                continue
+            article = node.parent
+            while article is not None and article.tag != 'article':
+                article = article.parent
+            card_node = article or node
+            price = card_node.css_first('span.item-price')
+            thumbnail = card_node.css_first('img')
+            cards.append(make_card(
+                href, card_node.attributes.get('data-element-id'), card_node.text(separator=" "),
+                title=node.attributes.get('title') or node.text(strip=True),
+                price=price.text(strip=True) if price else None,
+                details=[detail.text(strip=True) for detail in card_node.css('span.item-detail')],
+                thumbnail=thumbnail.attributes.get('src') if thumbnail else None,
+            ))
+        next_button = tree.css_first('a.icon-arrow-right-after')
+        next_href = next_button.attributes.get('href') if next_button else None
+        title = tree.css_first('h1')
+        title = title.text() if title else None
+    else:
+        soup = make_soup(html, backend)
+        for link in soup.find_all('a', class_='item-link'):
+            href = link.get('href')
+            if not href:
+                continue
+            card_node = link.find_parent('article') or link
+            price = card_node.find('span', class_='item-price')
+            thumbnail = card_node.find('img')
+            cards.append(make_card(
+                href, card_node.get('data-element-id'), card_node.get_text(" "),
+                title=link.get('title') or link.get_text(strip=True),
+                price=price.get_text(strip=True) if price else None,
+                details=[detail.get_text(strip=True) for detail in card_node.find_all('span', class_='item-detail')],
+                thumbnail=thumbnail.get('src') if thumbnail else None,
+            ))
+        next_button = soup.find('a', class_='icon-arrow-right-after')
+        next_href = next_button.get('href') if next_button else None
+        title = soup.find('h1')
+        title = title.get_text() if title else None
+
+    next_url = None
+    if next_href:
+        next_url = urlparse.urljoin(page_url, next_href) if page_url else next_href
+    return {"cards": cards, "next_url": next_url, "total_results": parse_total_results(title)}
@@ -0,0 +1,173 @@
+"""Métricas del rastreo y logger del paquete."""
+import bisect
+import json
+import logging
+import time
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+logger = logging.getLogger("idealista")
+
+class CrawlMetrics:
+    """
+    Contadores (con etiquetas) e histogramas de latencia por etapa: fetch, parse,
+    extract, translate y write. Se exportan como texto de Prometheus o como
+    instantánea JSON. Los procesos del pool de extracción acumulan las suyas y las
+    devuelven con drain() para sumarlas en el proceso principal con merge().
+    """
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Pone a cero contadores, histogramas y reloj; el proceso actual pasa a ser el dueño."""
+        self.pid = os.getpid()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.counters = {}      # (nombre, etiquetas ordenadas) -> valor
+        self.histograms = {}    # etapa -> {"buckets": [...], "sum": s, "count": n}
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def total(self, name):
+        """Suma de un contador en todas sus etiquetas."""
+        return sum(amount for (counter, _), amount in self.counters.items() if counter == name)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.setdefault(stage, {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+            histogram["buckets"][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        """Mide el bloque y lo anota en el histograma de la etapa."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def drain(self):
+        """Devuelve las métricas acumuladas y las pone a cero."""
+        with self.lock:
+            delta = {"counters": list(self.counters.items()), "histograms": self.histograms}
+            self.counters = {}
+            self.histograms = {}
+        return delta
+
+    def merge(self, delta):
+        """Suma las métricas devueltas por drain() en otro proceso."""
+        with self.lock:
+            for key, amount in delta["counters"]:
+                self.counters[key] = self.counters.get(key, 0) + amount
+            for stage, other in delta["histograms"].items():
+                histogram = self.histograms.setdefault(stage, {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], other["buckets"])]
+                histogram["sum"] += other["sum"]
+                histogram["count"] += other["count"]
+
+    def quantile(self, stage, q):
+        """Estimación del cuantil q de la etapa: límite superior de la cubeta que lo contiene."""
+        histogram = self.histograms.get(stage)
+        if not histogram or not histogram["count"]:
+            return None
+        target = q * histogram["count"]
+        seen = 0
+        for bound, amount in zip(self.buckets + (float("inf"),), histogram["buckets"]):
+            seen += amount
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        """Instantánea JSON: contadores, y por etapa número de medidas, media y p50/p95."""
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": amount}
+                        for (name, labels), amount in sorted(self.counters.items())]
+            stages = {
+                stage: {
+                    "count": histogram["count"],
+                    "sum_seconds": histogram["sum"],
+                    "mean_seconds": histogram["sum"] / histogram["count"] if histogram["count"] else None,
+                }
+                for stage, histogram in self.histograms.items()
+            }
+        for stage, summary in stages.items():
+            summary["p50_seconds"] = self.quantile(stage, 0.5)
+            summary["p95_seconds"] = self.quantile(stage, 0.95)
+        return {"uptime_seconds": time.monotonic() - self.started, "counters": counters, "stages": stages}
+
+    def prometheus(self):
+        """Exposición en el formato de texto de Prometheus."""
+        def labels_text(labels):
+            if not labels:
+                return ""
+            escaped = (key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"' for key, value in labels)
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self.lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE idealista_{name}_total counter")
+                for (counter, labels), amount in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"idealista_{name}_total{labels_text(labels)} {amount}")
+            if self.histograms:
+                lines.append("# TYPE idealista_stage_seconds histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, amount in zip(self.buckets + (float("inf"),), histogram["buckets"]):
+                    cumulative += amount
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'idealista_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'idealista_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'idealista_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Escribe las métricas en path (.json: instantánea JSON; otro: Prometheus) de forma atómica."""
+        content = json.dumps(self.snapshot(), indent=2) if path.endswith(".json") else self.prometheus()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+    def progress(self, total=None):
+        """Línea de progreso: anuncios procesados, ritmo y, si se conoce el total, ETA."""
+        ads = self.total("ads")
+        elapsed = time.monotonic() - self.started
+        rate = ads / elapsed if elapsed else 0.0
+        line = f"Progreso: {ads} anuncios, {self.total('pages')} páginas, {rate:.2f} anuncios/s"
+        if total:
+            line += f", {min(ads / total, 1.0) * 100:.1f} % de {total}"
+            if rate and ads < total:
+                line += f", ETA {timedelta(seconds=int((total - ads) / rate))}"
+        errors = sum(self.total(name) for name in {name for name, _ in self.counters} if name.endswith("errors"))
+        return line + (f", {errors} errores" if errors else "")
+
+metrics = CrawlMetrics()
+
+def process_metrics():
+    """Métricas del proceso actual; un proceso hijo empieza con las suyas vacías."""
+    if metrics.pid != os.getpid():
+        metrics.reset()
+    return metrics
+
+def field_error(field, message):
+    """Registra un error al extraer un campo y lo cuenta por campo."""
+    metrics.count("field_errors", field=field)
+    logger.warning(message)
+
+def field_missing(field, message):
+    """Registra que un campo no está en la página (no es un error) y lo cuenta por campo."""
+    metrics.count("field_missing", field=field)
+    logger.debug(message)
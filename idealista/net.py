@@ -0,0 +1,238 @@
+"""Sesiones HTTP, limitadores de ritmo y caché HTTP."""
+import asyncio
+import httpx
+import random
+import time
+import sqlite3
+import zlib
+import urllib.parse as urlparse
+
+from . import config
+from .extract import adid_pattern
+
+def get_random_headers():
+    return {
+        "User-Agent": random.choice(config.user_agents),
+        "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+        "Referer": "https://www.google.com/",
+    }
+
+class TokenBucket:
+    """Limita el ritmo de peticiones a un host: `rate` peticiones por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket cuyo ritmo se ajusta con AIMD según las respuestas del host: sube
+    `rate_increase` con cada respuesta rápida y se multiplica por `rate_decrease_factor`
+    ante una respuesta lenta, un 429/403, una página de bloqueo o un error de red. Las
+    peticiones en vuelo cuando el host empieza a quejarse reducen el ritmo una sola vez
+    por `rate_decrease_cooldown`.
+    """
+
+    def __init__(self, rate, capacity, min_rate=None, max_rate=None):
+        min_rate = config.min_requests_per_second if min_rate is None else min_rate
+        max_rate = config.max_requests_per_second if max_rate is None else max_rate
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.decreased_at = None
+
+    def reward(self, latency):
+        """Ajusta el ritmo tras una respuesta correcta según lo que tardó el servidor en darla."""
+        if latency < config.slow_response_seconds:
+            self.rate = min(self.max_rate, self.rate + config.rate_increase)
+        else:
+            self.throttle()
+
+    def throttle(self, pause=None):
+        """Reduce el ritmo y, si el servidor lo pide (Retry-After), detiene el host `pause` segundos."""
+        now = time.monotonic()
+        if self.decreased_at is None or now - self.decreased_at >= config.rate_decrease_cooldown:
+            self.rate = max(self.min_rate, self.rate * config.rate_decrease_factor)
+            self.decreased_at = now
+        if pause:
+            self.tokens = min(self.tokens, 0.0) - pause * self.rate
+
+class CrawlSession:
+    """
+    Identidad de navegación estable: cliente HTTP con su propio pool de conexiones
+    keep-alive, su tarro de cookies y un User-Agent fijo durante toda la sesión.
+    """
+
+    def __init__(self, http2=None):
+        http2 = config.use_http2 if http2 is None else http2
+        self.headers = get_random_headers()
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            http2=http2,
+            headers=self.headers,
+            limits=httpx.Limits(max_keepalive_connections=config.keepalive_connections),
+        )
+        self.in_flight = 0
+        self.needs_warm_up = True
+
+    def rotate(self):
+        """Cambia de identidad tras un bloqueo: nuevo User-Agent y cookies vacías."""
+        self.headers = get_random_headers()
+        self.client.headers.update(self.headers)
+        self.client.cookies.clear()
+        self.needs_warm_up = True
+
+    async def close(self):
+        await self.client.aclose()
+
+class SessionPool:
+    """Reparte las peticiones entre `size` sesiones por turno rotatorio o por menor carga."""
+
+    def __init__(self, size=None, assignment=None, http2=None):
+        size = config.session_count if size is None else size
+        assignment = config.session_assignment if assignment is None else assignment
+        http2 = config.use_http2 if http2 is None else http2
+        if assignment not in ("least-loaded", "round-robin"):
+            raise ValueError(f"Reparto de sesiones desconocido: {assignment}")
+        self.sessions = [CrawlSession(http2) for _ in range(max(1, size))]
+        self.assignment = assignment
+        self.turn = 0
+
+    def acquire(self):
+        """
+        Elige sesión y la reserva (in_flight + 1) en el mismo paso, sin await de por medio:
+        así las peticiones simultáneas ven la carga de las que esperan al limitador.
+        Quien la recibe descuenta in_flight al terminar.
+        """
+        if self.assignment == "round-robin":
+            session = self.sessions[self.turn % len(self.sessions)]
+            self.turn += 1
+        else:
+            session = min(self.sessions, key=lambda session: session.in_flight)
+        session.in_flight += 1
+        return session
+
+    async def close(self):
+        await asyncio.gather(*(session.close() for session in self.sessions))
+
+def url_class(url):
+    """Clasifica una URL como portada, listado o ficha para elegir su TTL en la caché."""
+    path = urlparse.urlparse(url).path
+    if path in ("", "/"):
+        return "landing"
+    if adid_pattern.search(path):
+        return "detail"
+    return "listing"
+
+class HttpCache:
+    """
+    Caché HTTP en disco (SQLite). Guarda el cuerpo comprimido de cada respuesta con su
+    ETag y Last-Modified: dentro del TTL de su tipo de URL se sirve sin red y, pasado
+    el TTL, se revalida con If-None-Match/If-Modified-Since. Al superar `max_bytes`
+    expulsa las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, path=None, max_bytes=None, ttl=None):
+        path = config.http_cache_file if path is None else path
+        max_bytes = config.http_cache_max_bytes if max_bytes is None else max_bytes
+        self.max_bytes = max_bytes
+        self.ttl = ttl or config.http_cache_ttl
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, size INTEGER, "
+            "stored_at REAL, last_used REAL);"
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);"
+            "CREATE INDEX IF NOT EXISTS responses_size ON responses (size);"
+        )
+        self.db.commit()
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def lookup(self, url):
+        """Devuelve (cuerpo, vigente, cabeceras condicionales) o None si la URL no está en caché."""
+        row = self.db.execute(
+            "SELECT etag, last_modified, body, stored_at FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        etag, last_modified, body, stored_at = row
+        self.db.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+        self.db.commit()
+        fresh = time.time() - stored_at < self.ttl.get(url_class(url), 0)
+        validators = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return zlib.decompress(body).decode("utf-8"), fresh, validators
+
+    def refresh(self, url):
+        """El servidor respondió 304: la copia guardada vuelve a estar vigente."""
+        self.revalidated += 1
+        self.db.execute("UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url))
+        self.db.commit()
+
+    def store(self, url, response):
+        body = zlib.compress(response.text.encode("utf-8"), 6)
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), body, len(body), now, now),
+        )
+        # Los shards comparten el fichero: el tamaño se suma en la tabla dentro de la misma transacción
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while self.size > self.max_bytes:
+            evicted = self.db.execute(
+                "SELECT url, size FROM responses ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not evicted:
+                break
+            for evicted_url, evicted_size in evicted:
+                if self.size <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM responses WHERE url = ?", (evicted_url,))
+                self.size -= evicted_size
+        self.db.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses, "bytes": self.size}
+
+    def close(self):
+        self.db.close()
+
+class FetchError(Exception):
+    """Una URL no se pudo descargar (error definitivo o reintentos agotados)."""
+
+def is_block_page(html):
+    """Detecta las páginas de captcha o bloqueo que el sitio sirve con código 200."""
+    return any(marker in html for marker in config.block_page_markers)
+
+def retry_after_seconds(response):
+    """Segundos indicados en la cabecera Retry-After, si los hay."""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt):
+    """Espera exponencial con jitter antes del reintento número `attempt` (desde 0)."""
+    return min(config.backoff_cap, config.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
@@ -0,0 +1,430 @@
+"""Salida de registros: NDJSON comprimido, JSON heredado y tablas Parquet."""
+import json
+import gzip
+import io
+import os
+import textwrap
+import zlib
+from dataclasses import dataclass, fields
+
+from . import config
+
+def open_output(path, mode, compression=None):
+    """Abre un fichero de salida en modo texto, comprimido con gzip o zstd si se pide."""
+    if compression is None:
+        return open(path, mode, encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("La compresión 'zstd' requiere el paquete zstandard") from None
+        return zstandard.open(path, mode + "t", encoding="utf-8")
+    raise ValueError(f"Compresión desconocida: {compression}")
+
+class RecordWriter:
+    """
+    Escribe cada registro como una línea NDJSON en cuanto se produce, de modo que
+    la memoria no crece con el rastreo y un fallo no pierde lo ya extraído.
+    Cada `fsync_every` registros fuerza la escritura a disco. Un flujo gzip o zstd cortado
+    por la muerte del proceso no admite continuar: al reanudar con compresión se escribe
+    un segmento nuevo (`path.1`, `path.2`...) que merge_segments une al terminar. Sin
+    compresión se continúa el mismo fichero tras descartar la última línea a medias.
+    """
+
+    def __init__(self, path=None, compression=None, fsync_every=None, append=False):
+        path = config.output_file if path is None else path
+        fsync_every = config.fsync_interval if fsync_every is None else fsync_every
+        if compression is not None:
+            segments = segment_paths(path)
+            if append and os.path.exists(path):
+                path, append = f"{path}.{len(segments)}", False
+            elif not append:
+                for segment in segments[1:]:
+                    os.remove(segment)
+        elif append and os.path.exists(path):
+            truncate_partial_line(path)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.count = 0
+        self.file = open_output(path, "a" if append else "w", compression)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+        if self.fsync_every and self.count % self.fsync_every == 0:
+            self.sync()
+
+    def flush(self):
+        """Pasa al sistema operativo lo escrito, para que sobreviva a la muerte del proceso."""
+        self.file.flush()
+
+    def sync(self):
+        self.file.flush()
+        try:
+            os.fsync(self.file.fileno())
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+def iter_records(path, compression=None):
+    """Lee un fichero NDJSON registro a registro."""
+    with open_output(path, "r", compression) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def truncate_partial_line(path):
+    """Recorta el fichero tras su último salto de línea: quita el registro que un proceso muerto dejó a medias."""
+    with open(path, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - (1 << 16))
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            file.truncate(position)
+
+def segment_paths(path):
+    """El fichero de salida seguido de los segmentos que existan de reanudaciones anteriores."""
+    paths = [path]
+    while os.path.exists(f"{path}.{len(paths)}"):
+        paths.append(f"{path}.{len(paths)}")
+    return paths
+
+def recover_records(path, compression=None):
+    """
+    Lee un fichero NDJSON que pudo quedar cortado: descomprime por trozos hasta donde
+    llegue el flujo y descarta la última línea si quedó a medias.
+    """
+    if compression == "gzip":
+        decompressor = zlib.decompressobj(wbits=31)
+    elif compression == "zstd":
+        import zstandard
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = None
+    pending = b""
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 16):
+            pending += decompressor.decompress(chunk) if decompressor else chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+def merge_segments(path, compression=None):
+    """Une al fichero de salida los segmentos escritos al reanudar con compresión."""
+    paths = segment_paths(path)
+    if len(paths) == 1:
+        return
+    merged = f"{path}.merging"
+    with RecordWriter(merged, compression) as writer:
+        for segment in paths:
+            for record in recover_records(segment, compression):
+                writer.write(record)
+    os.replace(merged, path)
+    for segment in paths[1:]:
+        os.remove(segment)
+
+def merge_outputs(paths, output_path, compression=None):
+    """Une varios ficheros NDJSON en uno, registro a registro."""
+    count = 0
+    with RecordWriter(output_path, compression) as writer:
+        for path in paths:
+            if os.path.exists(path):
+                for record in iter_records(path, compression):
+                    writer.write(record)
+                    count += 1
+    return count
+
+def write_json_array(ndjson_path, json_path, compression=None):
+    """Genera el array JSON indentado del formato antiguo sin cargar todos los registros en memoria."""
+    with open(json_path, "w", encoding="utf-8") as file:
+        file.write("[")
+        for index, record in enumerate(iter_records(ndjson_path, compression)):
+            file.write(",\n" if index else "\n")
+            file.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=4), "    "))
+        file.write("\n]" if file.tell() > 1 else "]")
+
+# --- Salida columnar ---
+
+@dataclass(slots=True)
+class PropertyRecord:
+    """Fila de la tabla principal: el registro con ubication, moreCharacteristics y priceInfo aplanados."""
+    adid: str | None = None
+    change: str | None = None            # modo incremental: added, changed o removed
+    source: str | None = None            # "detail" o "card"
+    duplicateOf: str | None = None       # adid del anuncio original si es un duplicado
+    price: int | None = None
+    currencySuffix: str | None = None
+    operation: str | None = None
+    propertyType: str | None = None
+    state: str | None = None
+    country: str | None = None
+    title: str | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    locationId: str | None = None
+    administrativeAreaLevel1: str | None = None
+    administrativeAreaLevel2: str | None = None
+    administrativeAreaLevel3: str | None = None
+    administrativeAreaLevel4: str | None = None
+    roomNumber: int | None = None
+    bathNumber: int | None = None
+    constructedArea: float | None = None
+    communityCosts: float | None = None
+    floor: str | None = None
+    flatLocation: str | None = None
+    status: str | None = None
+    energyCertificationType: str | None = None
+    isStudio: bool | None = None
+    exterior: bool | None = None
+    housingFurnitures: bool | None = None
+    isPenthouse: bool | None = None
+    swimmingPool: bool | None = None
+    lift: bool | None = None
+    garden: bool | None = None
+    boxroom: bool | None = None
+    isDuplex: bool | None = None
+    energyConsumption: str | None = None
+    energyEmissions: str | None = None
+    detailWebLink: str | None = None
+    allowsCounterOffers: bool | None = None
+    allowsRemoteVisit: bool | None = None
+    allowsMortgageSimulator: bool | None = None
+    allowsProfileQualification: bool | None = None
+    allowsRecommendation: bool | None = None
+    has360VHS: bool | None = None
+    isSuitableForRecommended: bool | None = None
+    modificationDate: int | None = None  # milisegundos desde la época Unix
+    modificationText: str | None = None
+    imageCount: int | None = None
+
+@dataclass(slots=True)
+class CommentTranslation:
+    """Fila de la tabla de traducciones: un comentario en un idioma."""
+    adid: str | None
+    language: str | None
+    propertyComment: str | None
+    autoTranslated: bool | None
+    defaultLanguage: bool | None
+
+@dataclass(slots=True)
+class RecordImage:
+    """Fila de la tabla de imágenes: una imagen del anuncio, su posición y el id de su URL."""
+    adid: str | None
+    position: int
+    imageId: int
+    tag: str | None
+    deeplinkUrl: str | None
+
+@dataclass(slots=True)
+class ImageUrl:
+    """Fila de la tabla de URL internadas: cada foto distinta una sola vez para todos los anuncios."""
+    imageId: int
+    url: str | None
+
+def as_number(value, kind):
+    """Convierte un valor del registro ("95", "1.200") a int o float; None si no es numérico."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return kind(value.replace('.', '') if isinstance(value, str) and kind is int else value)
+    except (TypeError, ValueError):
+        return None
+
+def split_record(record, intern, change=None, adid=None):
+    """
+    Reparte un registro en su fila principal, sus traducciones y sus imágenes.
+    intern(url) devuelve el id de la URL en la tabla compartida de URL de imágenes.
+    """
+    record = record or {}
+    adid = record.get("adid") or adid
+    ubication = record.get("ubication") or {}
+    areas = ubication.get("administrativeAreas") or {}
+    characteristics = record.get("moreCharacteristics") or {}
+    energy = {(item.get("prefix") or "").rstrip(":").lower(): item.get("suffix")
+              for item in record.get("energyCertification") or []}
+    modification = record.get("modificationDate") or {}
+    images = (record.get("multimedia") or {}).get("images") or []
+    row = PropertyRecord(
+        adid=adid,
+        change=change,
+        source=record.get("source", "detail") if record else None,
+        duplicateOf=record.get("duplicateOf"),
+        price=as_number(record.get("price"), int),
+        currencySuffix=(record.get("priceInfo") or {}).get("currencySuffix"),
+        operation=record.get("operation"),
+        propertyType=record.get("propertyType"),
+        state=record.get("state"),
+        country=record.get("country"),
+        title=ubication.get("title"),
+        latitude=ubication.get("latitude"),
+        longitude=ubication.get("longitude"),
+        locationId=ubication.get("locationId"),
+        administrativeAreaLevel1=areas.get("administrativeAreaLevel1"),
+        administrativeAreaLevel2=areas.get("administrativeAreaLevel2"),
+        administrativeAreaLevel3=areas.get("administrativeAreaLevel3"),
+        administrativeAreaLevel4=areas.get("administrativeAreaLevel4"),
+        roomNumber=as_number(characteristics.get("roomNumber"), int),
+        bathNumber=as_number(characteristics.get("bathNumber"), int),
+        constructedArea=as_number(characteristics.get("constructedArea"), float),
+        communityCosts=as_number(characteristics.get("communityCosts"), float),
+        floor=characteristics.get("floor"),
+        flatLocation=characteristics.get("flatLocation"),
+        status=characteristics.get("status"),
+        energyCertificationType=characteristics.get("energyCertificationType"),
+        isStudio=characteristics.get("isStudio"),
+        exterior=characteristics.get("exterior"),
+        housingFurnitures=characteristics.get("housingFurnitures"),
+        isPenthouse=characteristics.get("isPenthouse"),
+        swimmingPool=characteristics.get("swimmingPool"),
+        lift=characteristics.get("lift"),
+        garden=characteristics.get("garden"),
+        boxroom=characteristics.get("boxroom"),
+        isDuplex=characteristics.get("isDuplex"),
+        energyConsumption=energy.get("consumo"),
+        energyEmissions=energy.get("emisiones"),
+        detailWebLink=record.get("detailWebLink"),
+        allowsCounterOffers=record.get("allowsCounterOffers"),
+        allowsRemoteVisit=record.get("allowsRemoteVisit"),
+        allowsMortgageSimulator=record.get("allowsMortgageSimulator"),
+        allowsProfileQualification=record.get("allowsProfileQualification"),
+        allowsRecommendation=record.get("allowsRecommendation"),
+        has360VHS=record.get("has360VHS"),
+        isSuitableForRecommended=(record.get("tracking") or {}).get("isSuitableForRecommended"),
+        modificationDate=modification.get("value"),
+        modificationText=modification.get("text"),
+        imageCount=len(images) if record else None,
+    )
+    translations = [
+        CommentTranslation(adid, comment.get("language"), comment.get("propertyComment"),
+                           comment.get("autoTranslated"), comment.get("defaultLanguage"))
+        for comment in record.get("comments") or []
+    ]
+    image_rows = [
+        RecordImage(adid, position, intern(image.get("url")), image.get("tag"), image.get("deeplinkUrl"))
+        for position, image in enumerate(images)
+    ]
+    return row, translations, image_rows
+
+# pyarrow tarda en cargarse: se importa al abrir la primera tabla Parquet
+pyarrow = None
+
+def load_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("La salida Parquet requiere el paquete pyarrow") from None
+    return pyarrow
+
+def arrow_schema(row_class):
+    """Esquema Arrow a partir de las anotaciones de una clase de fila (X | None es anulable)."""
+    arrow_types = {str: pyarrow.string(), int: pyarrow.int64(), float: pyarrow.float64(), bool: pyarrow.bool_()}
+    columns = []
+    for field in fields(row_class):
+        kind = next(arg for arg in getattr(field.type, "__args__", (field.type,)) if arg is not type(None))
+        columns.append(pyarrow.field(field.name, arrow_types[kind]))
+    return pyarrow.schema(columns)
+
+class ColumnarWriter:
+    """
+    Escribe los registros en un directorio de tablas Parquet: records.parquet (una fila
+    plana por anuncio), translations.parquet, images.parquet e image_urls.parquet, donde
+    cada URL de imagen aparece una sola vez y las imágenes la referencian por id. Las filas se
+    acumulan y se escriben por grupos de `row_group_size` registros, de modo que la
+    memoria no crece con la salida. Acepta registros completos y los deltas del modo
+    incremental ({"change", "adid", "record"}).
+    """
+    tables = {"records": PropertyRecord, "translations": CommentTranslation, "images": RecordImage, "image_urls": ImageUrl}
+
+    def __init__(self, directory=None, row_group_size=None, compression="zstd", full_images=False):
+        directory = config.parquet_output_dir if directory is None else directory
+        row_group_size = config.parquet_row_group_size if row_group_size is None else row_group_size
+        load_pyarrow()
+        os.makedirs(directory, exist_ok=True)
+        self.row_group_size = row_group_size
+        self.count = 0
+        self.resolve = None
+        if full_images:
+            # extract (y bs4) solo se carga si se piden las imágenes a máxima resolución
+            from .extract import full_resolution_url
+            self.resolve = full_resolution_url
+        self.image_ids = {}
+        self.columns = {name: [field.name for field in fields(row_class)] for name, row_class in self.tables.items()}
+        self.rows = {name: [] for name in self.tables}
+        self.writers = {
+            name: pyarrow.parquet.ParquetWriter(os.path.join(directory, f"{name}.parquet"), arrow_schema(row_class),
+                                                compression=compression)
+            for name, row_class in self.tables.items()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def intern(self, url):
+        """Id de la URL en la tabla compartida; las URL nuevas se añaden a image_urls."""
+        if self.resolve is not None and url:
+            url = self.resolve(url)
+        image_id = self.image_ids.get(url)
+        if image_id is None:
+            image_id = self.image_ids[url] = len(self.image_ids)
+            self.rows["image_urls"].append(ImageUrl(image_id, url))
+        return image_id
+
+    def write(self, item):
+        if "change" in item and "record" in item:
+            row, translations, images = split_record(item["record"], self.intern, item["change"], item["adid"])
+        else:
+            row, translations, images = split_record(item, self.intern)
+        self.rows["records"].append(row)
+        self.rows["translations"].extend(translations)
+        self.rows["images"].extend(images)
+        self.count += 1
+        if len(self.rows["records"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Escribe las filas acumuladas como un grupo de filas de cada tabla."""
+        for name, rows in self.rows.items():
+            if rows:
+                columns = {column: [getattr(row, column) for row in rows] for column in self.columns[name]}
+                self.writers[name].write_table(pyarrow.table(columns, schema=self.writers[name].schema))
+                rows.clear()
+
+    def close(self):
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+
+def write_parquet(ndjson_path, directory, compression=None, full_images=False):
+    """
+    Exporta una salida NDJSON a tablas Parquet, registro a registro. Con full_images,
+    image_urls lleva cada foto en su variante a máxima resolución.
+    """
+    with ColumnarWriter(directory, full_images=full_images) as writer:
+        for record in iter_records(ndjson_path, compression):
+            writer.write(record)
+    return writer.count
@@ -0,0 +1,41 @@
+"""Re-extracción sin red desde el archivo de páginas."""
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+from .extract import make_soup, scan_embedded, extract_data_from_html
+from .metrics import logger
+from .output import RecordWriter
+from .store import PageArchive
+
+worker_archive = None
+
+def init_reextract_worker(directory):
+    global worker_archive
+    worker_archive = PageArchive(directory)
+
+def reextract_page(entry):
+    """Extrae una ficha archivada en un proceso del pool (sin traducciones ni red)."""
+    url, fetched_at, digest = entry
+    try:
+        html = worker_archive.read(digest)
+        return extract_data_from_html(make_soup(html), translate=False, embedded=scan_embedded(html))
+    except Exception as e:
+        logger.error(f"Error al re-extraer {url}: {e}")
+        return None
+
+def reextract(directory=None, output_path=None, workers=None):
+    """Vuelve a ejecutar la extracción sobre la última versión archivada de cada ficha."""
+    directory = config.archive_dir if directory is None else directory
+    output_path = config.reextract_output_file if output_path is None else output_path
+    workers = config.reextract_workers if workers is None else workers
+    archive = PageArchive(directory)
+    entries = archive.entries("detail")
+    archive.close()
+    logger.info(f"Re-extrayendo {len(entries)} fichas de {directory} con {workers} procesos...")
+    with RecordWriter(output_path, config.output_compression) as writer:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_reextract_worker, initargs=(directory,)) as pool:
+            for record in pool.map(reextract_page, entries, chunksize=16):
+                if record is not None:
+                    writer.write(record)
+    logger.info(f"{writer.count} anuncios guardados en {output_path}")
+    return writer.count
@@ -0,0 +1,210 @@
+"""Rastreo por shards en un pool de procesos."""
+import asyncio
+import sqlite3
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+from .crawler import AsyncCrawler
+from .geo import GeoIndex
+from .metrics import logger
+from .net import HttpCache
+from .output import RecordWriter, merge_outputs, merge_segments
+from .store import AdIndex, CrawlFrontier, DuplicateIndex, PageArchive
+
+operation_slugs = {"sale": "venta", "rent": "alquiler"}
+property_type_slugs = {
+    "homes": "viviendas",
+    "offices": "oficinas",
+    "premises": "locales",
+    "garages": "garajes",
+    "lands": "terrenos",
+}
+# Cortes iniciales de precio cuando un shard supera el tope de paginación
+price_cuts = {
+    "sale": [50000, 100000, 150000, 200000, 300000, 500000, 1000000],
+    "rent": [500, 750, 1000, 1500, 2500],
+}
+min_price_band = {"sale": 5000, "rent": 50}
+
+class AdClaims:
+    """
+    Conjunto de adid compartido entre procesos (SQLite). Cada anuncio lo descarga solo
+    el primer shard que lo reclama, aunque aparezca en varios listados.
+    """
+
+    def __init__(self, path, owner):
+        self.owner = owner
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS claims (adid TEXT PRIMARY KEY, owner TEXT)")
+        self.db.commit()
+
+    def claim(self, cards):
+        """Devuelve las tarjetas cuyo anuncio pertenece a este shard."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO claims VALUES (?, ?)",
+                [(card["adid"], self.owner) for card in cards if card["adid"]],
+            )
+            owners = dict(self.db.execute(
+                f"SELECT adid, owner FROM claims WHERE adid IN ({','.join('?' * len(cards))})",
+                [card["adid"] for card in cards],
+            ).fetchall()) if cards else {}
+        return [card for card in cards if not card["adid"] or owners.get(card["adid"]) == self.owner]
+
+    def close(self):
+        self.db.close()
+
+def shard_url(region, operation, property_type, price_band=None):
+    """URL del listado de un shard, con filtro de precio opcional."""
+    url = f"{config.site_url}/geo/{operation_slugs[operation]}-{property_type_slugs[property_type]}/{region}/"
+    if price_band:
+        low, high = price_band
+        filters = []
+        if low:
+            filters.append(f"precio-desde_{low}")
+        if high:
+            filters.append(f"precio-hasta_{high}")
+        url += f"con-{','.join(filters)}/"
+    return url
+
+def split_band(operation, price_band):
+    """Parte una banda de precio: primero por los cortes fijos, luego por la mitad."""
+    low, high = price_band
+    cuts = [cut for cut in price_cuts[operation] if low < cut and (high is None or cut < high)]
+    if cuts:
+        edges = [low] + cuts + [high]
+        return list(zip(edges, edges[1:]))
+    if high is None or high - low <= min_price_band[operation]:
+        return []
+    middle = (low + high) // 2
+    return [(low, middle), (middle, high)]
+
+async def plan_shards(regions, operations, property_types):
+    """
+    Divide cada combinación región/operación/tipo en bandas de precio hasta que
+    ningún shard supere el tope de paginación del sitio.
+    """
+    capacity = config.max_pages_per_shard * config.results_per_page
+    shards = []
+    async with AsyncCrawler(None, None, config.site_url, parse_workers=0, metrics_path=None) as crawler:
+        for region in regions:
+            for operation in operations:
+                for property_type in property_types:
+                    bands = [None]
+                    while bands:
+                        band = bands.pop()
+                        url = shard_url(region, operation, property_type, band)
+                        total = (await crawler.fetch_listing(url))["total_results"]
+                        sub_bands = split_band(operation, band or (0, None)) if total and total > capacity else []
+                        if sub_bands:
+                            bands.extend(sub_bands)
+                            continue
+                        if total and total > capacity:
+                            logger.warning(f"El shard {url} supera el tope de paginación ({total} resultados).")
+                        name = f"{region}-{operation}-{property_type}"
+                        if band:
+                            name += f"-{band[0]}-{band[1] or 'max'}"
+                        shards.append({"name": name, "url": url, "operation": operation, "propertyType": property_type, "total": total})
+    return shards
+
+def run_shard(shard):
+    """Rastrea un shard en su propio proceso, con frontera y salida propias."""
+    frontier = CrawlFrontier(os.path.join(config.shard_dir, f"{shard['name']}.frontier.sqlite"))
+    if frontier.is_complete():
+        frontier.reset()
+    resuming = frontier.has_progress()
+    claims = AdClaims(os.path.join(config.shard_dir, "claims.sqlite"), shard["name"])
+    # En modo incremental todos los shards marcan lo que ven en la ejecución que abrió crawl_sharded
+    ad_index = None
+    if config.incremental:
+        ad_index = AdIndex(config.ad_index_file)
+        ad_index.begin_run(resuming=True)
+    overrides = {"operation": shard["operation"], "propertyType": shard["propertyType"]}
+
+    async def crawl_shard(writer):
+        # Los procesos de extracción y el presupuesto por host se reparten entre los shards que corren a la vez:
+        # cada shard tiene su propio limitador, y el host ve la suma de todos
+        workers = max(1, config.parse_workers // config.shard_workers) if config.parse_workers else 0
+        rate = config.requests_per_second / config.shard_workers
+        burst = max(1, config.burst_size // config.shard_workers)
+        max_rate = config.max_requests_per_second / config.shard_workers
+        metrics_path = os.path.join(config.shard_dir, f"{shard['name']}.{config.metrics_file}") if config.metrics_file else None
+        async with AsyncCrawler(writer, frontier, config.site_url, rate=rate, burst=burst, max_rate=max_rate, ad_index=ad_index, claims=claims, record_overrides=overrides, archive=archive, parse_workers=workers, http_cache=http_cache, mode=config.crawl_mode, metrics_path=metrics_path, duplicates=duplicates, geo_index=geo_index, emit_removed=False) as crawler:
+            await crawler.crawl(shard["url"])
+
+    archive = PageArchive(os.path.join(config.shard_dir, f"{shard['name']}.archive")) if config.archive_pages else None
+    http_cache = HttpCache(config.http_cache_file) if config.use_http_cache else None
+    duplicates = DuplicateIndex(os.path.join(config.shard_dir, config.duplicate_index_file)) if config.detect_duplicates else None
+    geo_index = GeoIndex(config.geo_index_file) if config.build_geo_index else None
+    output_path = os.path.join(config.shard_dir, f"{shard['name']}.ndjson")
+    with RecordWriter(output_path, config.output_compression, append=resuming) as writer:
+        asyncio.run(crawl_shard(writer))
+    merge_segments(output_path, config.output_compression)
+    frontier.close()
+    claims.close()
+    if ad_index is not None:
+        ad_index.close()
+    if geo_index is not None:
+        geo_index.close()
+    if duplicates is not None:
+        duplicates.close()
+    if http_cache is not None:
+        http_cache.close()
+    if archive is not None:
+        archive.close()
+    return writer.count
+
+def shard_in_progress(shard):
+    """Indica si el shard tiene un rastreo a medias que reanudar."""
+    path = os.path.join(config.shard_dir, f"{shard['name']}.frontier.sqlite")
+    if not os.path.exists(path):
+        return False
+    frontier = CrawlFrontier(path)
+    in_progress = frontier.has_progress() and not frontier.is_complete()
+    frontier.close()
+    return in_progress
+
+def crawl_sharded():
+    """Planifica los shards, los rastrea en un pool de procesos y une las salidas."""
+    os.makedirs(config.shard_dir, exist_ok=True)
+    shards = asyncio.run(plan_shards(config.regions, config.operations_to_crawl, config.property_types_to_crawl))
+    logger.info(f"{len(shards)} shards planificados")
+
+    # Un rastreo nuevo (ningún shard a medias) empieza con el conjunto de adid vacío
+    resuming = any(shard_in_progress(shard) for shard in shards)
+    if not resuming:
+        for suffix in ("", "-wal", "-shm"):
+            path = os.path.join(config.shard_dir, "claims.sqlite" + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+    # En modo incremental la ejecución se abre aquí y las bajas se emiten al terminar todos los shards:
+    # cada shard solo ve su parte del listado
+    ad_index = None
+    if config.incremental:
+        ad_index = AdIndex(config.ad_index_file)
+        ad_index.begin_run(resuming)
+    with ProcessPoolExecutor(max_workers=config.shard_workers) as pool:
+        for shard, count in zip(shards, pool.map(run_shard, shards)):
+            logger.info(f"Shard {shard['name']}: {count} {'cambios' if config.incremental else 'anuncios'}")
+    paths = [os.path.join(config.shard_dir, f"{shard['name']}.ndjson") for shard in shards]
+    if ad_index is not None:
+        if not any(shard_in_progress(shard) for shard in shards):
+            paths.append(write_removed(ad_index))
+        ad_index.close()
+    return merge_outputs(paths, config.output_file, config.output_compression)
+
+def write_removed(ad_index):
+    """Da de baja los anuncios que ningún shard vio en esta ejecución y escribe sus deltas."""
+    removed = ad_index.mark_removed()
+    path = os.path.join(config.shard_dir, "removed.ndjson")
+    with RecordWriter(path, config.output_compression) as writer:
+        for adid in removed:
+            writer.write({"change": "removed", "adid": adid, "record": None})
+    if config.build_geo_index:
+        geo_index = GeoIndex(config.geo_index_file)
+        geo_index.remove(removed)
+        geo_index.close()
+    logger.info(f"{len(removed)} anuncios retirados desde la última ejecución.")
+    return path
@@ -0,0 +1,370 @@
+"""Estado persistente del rastreo: frontera, índice de anuncios, duplicados y archivo de páginas."""
+import json
+import math
+import time
+import hashlib
+import sqlite3
+import mmap
+import os
+import zlib
+import re
+
+from . import config
+from .output import as_number
+
+class CrawlFrontier:
+    """
+    Frontera persistente del rastreo en SQLite: páginas de listado visitadas y fichas
+    descubiertas, descargadas o fallidas con su número de reintentos. Permite reanudar
+    un rastreo interrumpido sin volver a descargar los anuncios ya guardados.
+    """
+
+    def __init__(self, path=None, max_retries=None):
+        path = config.frontier_file if path is None else path
+        max_retries = config.max_detail_retries if max_retries is None else max_retries
+        self.max_retries = max_retries
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "page INTEGER PRIMARY KEY, url TEXT, status TEXT, next_url TEXT, retries INTEGER DEFAULT 0, error TEXT);"
+            "CREATE TABLE IF NOT EXISTS details ("
+            "url TEXT PRIMARY KEY, page INTEGER, status TEXT, retries INTEGER DEFAULT 0, error TEXT);"
+        )
+        self.db.commit()
+
+    def has_progress(self):
+        """Indica si hay estado de una ejecución anterior."""
+        return bool(self.db.execute("SELECT EXISTS (SELECT 1 FROM pages) OR EXISTS (SELECT 1 FROM details)").fetchone()[0])
+
+    def resume_point(self, first_url):
+        """(página, URL) del primer listado por procesar, o None si el listado se recorrió entero."""
+        row = self.db.execute(
+            "SELECT page, next_url FROM pages WHERE status = 'done' ORDER BY page DESC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return 1, first_url
+        page, next_url = row
+        return (page + 1, next_url) if next_url else None
+
+    def is_complete(self):
+        """El listado terminó y no quedan fichas con reintentos disponibles."""
+        return self.has_progress() and self.resume_point(None) is None and not self.pending_details()
+
+    def reset(self):
+        self.db.execute("DELETE FROM pages")
+        self.db.execute("DELETE FROM details")
+        self.db.commit()
+
+    def page_done(self, page, url, next_url):
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages (page, url, status, next_url) VALUES (?, ?, 'done', ?)",
+            (page, url, next_url),
+        )
+        self.db.commit()
+
+    def page_failed(self, page, url, error):
+        self.db.execute(
+            "INSERT INTO pages (page, url, status, retries, error) VALUES (?, ?, 'failed', 1, ?) "
+            "ON CONFLICT (page) DO UPDATE SET status = 'failed', retries = retries + 1, error = excluded.error",
+            (page, url, error),
+        )
+        self.db.commit()
+
+    def add_details(self, page, urls):
+        """Registra las fichas descubiertas; las ya conocidas conservan su estado."""
+        self.db.executemany(
+            "INSERT OR IGNORE INTO details (url, page, status) VALUES (?, ?, 'pending')",
+            [(url, page) for url in urls],
+        )
+        self.db.commit()
+
+    def known_details(self, urls):
+        """Las urls que ya están en la frontera, en cualquier estado."""
+        rows = self.db.execute(f"SELECT url FROM details WHERE url IN ({','.join('?' * len(urls))})", list(urls))
+        return {url for (url,) in rows}
+
+    def cards_done(self, page, urls):
+        """Registra como guardados los anuncios que se escribieron solo con su tarjeta."""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO details (url, page, status) VALUES (?, ?, 'fetched')",
+            [(url, page) for url in urls],
+        )
+        self.db.commit()
+
+    def pending_details(self, page=None):
+        """Fichas sin descargar que aún tienen reintentos, de una página o de todas."""
+        query = "SELECT url FROM details WHERE status != 'fetched' AND retries < ?"
+        params = [self.max_retries]
+        if page is not None:
+            query += " AND page = ?"
+            params.append(page)
+        return [url for (url,) in self.db.execute(query, params)]
+
+    def details_done(self, urls):
+        self.db.executemany("UPDATE details SET status = 'fetched', error = NULL WHERE url = ?", [(url,) for url in urls])
+        self.db.commit()
+
+    def detail_failed(self, url, error):
+        self.db.execute(
+            "UPDATE details SET status = 'failed', retries = retries + 1, error = ? WHERE url = ?",
+            (error, url),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def record_fingerprint(record):
+    """
+    Huella del contenido de un registro. Excluye la fecha relativa "Anuncio actualizado
+    hace ..." (cambia con el reloj) y las traducciones automáticas.
+    """
+    content = dict(record)
+    content.pop("modificationDate", None)
+    content["comments"] = [comment for comment in record.get("comments") or [] if not comment.get("autoTranslated")]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class AdIndex:
+    """
+    Índice local adid -> huella de la tarjeta del listado, fecha de modificación y
+    huella del contenido, para el modo incremental. Solo se descargan las fichas
+    nuevas o cuya tarjeta cambió, y se emiten deltas added/changed/removed.
+    """
+
+    def __init__(self, path=None):
+        path = config.ad_index_file if path is None else path
+        # Los shards comparten el índice desde sus procesos
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS ads ("
+            "adid TEXT PRIMARY KEY, url TEXT, card_hash TEXT, modification_date TEXT, "
+            "content_hash TEXT, last_seen INTEGER, removed INTEGER DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS runs (run INTEGER);"
+        )
+        self.db.commit()
+        self.run = None
+
+    def begin_run(self, resuming):
+        """Inicia una ejecución (o continúa la anterior si se está reanudando)."""
+        row = self.db.execute("SELECT MAX(run) FROM runs").fetchone()
+        current = row[0] or 0
+        if resuming and current:
+            self.run = current
+        else:
+            self.run = current + 1
+            self.db.execute("INSERT INTO runs VALUES (?)", (self.run,))
+            self.db.commit()
+
+    def select_changed(self, cards):
+        """
+        Marca las tarjetas como vistas y devuelve las que requieren descargar la ficha.
+        Un anuncio listado cuenta como visto aunque su ficha falle después: no es una baja.
+        """
+        changed = []
+        for card in cards:
+            row = self.db.execute("SELECT card_hash, removed FROM ads WHERE adid = ?", (card["adid"],)).fetchone()
+            if row is None or row[1] or row[0] != card["fingerprint"]:
+                changed.append(card)
+            self.db.execute("UPDATE ads SET last_seen = ? WHERE adid = ?", (self.run, card["adid"]))
+        self.db.commit()
+        return changed
+
+    def update(self, adid, url, card_hash, record):
+        """Guarda el registro descargado y devuelve el tipo de cambio, o None si no cambió."""
+        content_hash = record_fingerprint(record)
+        modification_date = (record.get("moreCharacteristics") or {}).get("modificationDate")
+        row = self.db.execute("SELECT content_hash, removed FROM ads WHERE adid = ?", (adid,)).fetchone()
+        if row is None or row[1]:
+            change = "added"
+        elif row[0] != content_hash:
+            change = "changed"
+        else:
+            change = None
+        self.db.execute(
+            "INSERT OR REPLACE INTO ads (adid, url, card_hash, modification_date, content_hash, last_seen, removed) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (adid, url, card_hash, modification_date, content_hash, self.run),
+        )
+        self.db.commit()
+        return change
+
+    def mark_removed(self):
+        """Da de baja los anuncios no vistos en esta ejecución y devuelve sus adid."""
+        removed = [adid for (adid,) in self.db.execute(
+            "SELECT adid FROM ads WHERE removed = 0 AND last_seen < ?", (self.run,)
+        )]
+        self.db.executemany("UPDATE ads SET removed = 1 WHERE adid = ?", [(adid,) for adid in removed])
+        self.db.commit()
+        return removed
+
+    def close(self):
+        self.db.close()
+
+def simhash(text):
+    """SimHash de 64 bits de un texto a partir de sus trigramas de palabras."""
+    words = re.findall(r'\w+', text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Distancia en metros entre dos coordenadas (fórmula del semiverseno)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+def within(a, b, tolerance):
+    """Indica si dos valores difieren como mucho en la fracción tolerance del mayor."""
+    return abs(a - b) <= tolerance * max(abs(a), abs(b))
+
+class DuplicateIndex:
+    """
+    Índice de anuncios para detectar el mismo inmueble publicado por varias agencias
+    con distinto adid. Cada anuncio se guarda en una celda de una rejilla de
+    `duplicate_cell_degrees`; una búsqueda solo compara con los anuncios de la celda
+    y sus 8 vecinas, así que su coste no depende del tamaño del índice. Es duplicado
+    el anuncio con las mismas habitaciones, superficie y precio parecidos, a menos de
+    `duplicate_max_meters` y con un comentario casi igual (SimHash). El fichero se
+    comparte entre los procesos de los shards.
+    """
+
+    def __init__(self, path=None):
+        path = config.duplicate_index_file if path is None else path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS ads ("
+            "adid TEXT PRIMARY KEY, cell TEXT, latitude REAL, longitude REAL, "
+            "area REAL, rooms INTEGER, price INTEGER, simhash INTEGER);"
+            "CREATE INDEX IF NOT EXISTS ads_cell ON ads (cell);"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def cell(latitude, longitude):
+        return math.floor(latitude / config.duplicate_cell_degrees), math.floor(longitude / config.duplicate_cell_degrees)
+
+    @staticmethod
+    def features(record):
+        """(adid, latitud, longitud, superficie, habitaciones, precio, simhash) o None si faltan datos."""
+        ubication = record.get("ubication") or {}
+        characteristics = record.get("moreCharacteristics") or {}
+        latitude, longitude = ubication.get("latitude"), ubication.get("longitude")
+        area = as_number(characteristics.get("constructedArea"), float)
+        if not record.get("adid") or latitude is None or longitude is None or not area:
+            return None
+        comments = record.get("comments") or []
+        text = comments[0]["propertyComment"] if comments else None
+        # SQLite guarda enteros de 64 bits con signo
+        signature = simhash(text) - (1 << 63) if text else None
+        return (record["adid"], latitude, longitude, area, as_number(characteristics.get("roomNumber"), int),
+                as_number(record.get("price"), int), signature)
+
+    def match(self, record):
+        """adid del anuncio ya indexado del que record es duplicado, o None."""
+        features = self.features(record)
+        if features is None:
+            return None
+        adid, latitude, longitude, area, rooms, price, signature = features
+        row, column = self.cell(latitude, longitude)
+        cells = [f"{row + dr}:{column + dc}" for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+        candidates = self.db.execute(
+            f"SELECT adid, latitude, longitude, area, rooms, price, simhash FROM ads "
+            f"WHERE cell IN ({','.join('?' * len(cells))}) AND adid != ?",
+            cells + [adid],
+        ).fetchall()
+        for other, other_latitude, other_longitude, other_area, other_rooms, other_price, other_signature in candidates:
+            if rooms is not None and other_rooms is not None and rooms != other_rooms:
+                continue
+            if not within(area, other_area, config.duplicate_area_tolerance):
+                continue
+            if price and other_price and not within(price, other_price, config.duplicate_price_tolerance):
+                continue
+            if distance_meters(latitude, longitude, other_latitude, other_longitude) > config.duplicate_max_meters:
+                continue
+            if signature is None or other_signature is None:
+                continue
+            if ((signature + (1 << 63)) ^ (other_signature + (1 << 63))).bit_count() > config.duplicate_max_hamming:
+                continue
+            return other
+        return None
+
+    def add(self, record):
+        """Indexa (o actualiza) un anuncio original."""
+        features = self.features(record)
+        if features is None:
+            return
+        row, column = self.cell(features[1], features[2])
+        self.db.execute("INSERT OR REPLACE INTO ads VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (features[0], f"{row}:{column}") + features[1:])
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+class PageArchive:
+    """
+    Archivo de páginas HTML en bruto direccionado por contenido. Cada página distinta se
+    guarda una sola vez, comprimida con zlib, en un fichero de datos de solo anexado
+    (pages.pack) que se lee mapeado en memoria. Un índice SQLite relaciona cada URL y
+    fecha de descarga con el resumen SHA-256 de su contenido.
+    """
+
+    def __init__(self, directory=None):
+        directory = config.archive_dir if directory is None else directory
+        os.makedirs(directory, exist_ok=True)
+        self.pack_path = os.path.join(directory, "pages.pack")
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, offset INTEGER, length INTEGER);"
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT, kind TEXT, fetched_at REAL, digest TEXT);"
+            "CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);"
+        )
+        self.db.commit()
+        self.pack = None
+        self.map = None
+
+    def store(self, url, html, kind="detail"):
+        """Guarda una página descargada; el contenido repetido solo se indexa."""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        if self.db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone() is None:
+            if self.pack is None:
+                self.pack = open(self.pack_path, "ab")
+            compressed = zlib.compress(data, 6)
+            offset = self.pack.tell()
+            self.pack.write(compressed)
+            # Los datos llegan al fichero antes de que el índice apunte a ellos
+            self.pack.flush()
+            self.db.execute("INSERT INTO blobs VALUES (?, ?, ?)", (digest, offset, len(compressed)))
+        self.db.execute("INSERT INTO pages VALUES (?, ?, ?, ?)", (url, kind, time.time(), digest))
+        self.db.commit()
+        return digest
+
+    def entries(self, kind="detail"):
+        """Última versión archivada de cada URL: [(url, fetched_at, digest)]."""
+        return self.db.execute(
+            "SELECT url, MAX(fetched_at), digest FROM pages WHERE kind = ? GROUP BY url ORDER BY url", (kind,)
+        ).fetchall()
+
+    def read(self, digest):
+        """Devuelve el HTML de un resumen leyendo del fichero de datos mapeado en memoria."""
+        offset, length = self.db.execute("SELECT offset, length FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if self.map is None or offset + length > len(self.map):
+            if self.map is not None:
+                self.map.close()
+            with open(self.pack_path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return zlib.decompress(self.map[offset:offset + length]).decode("utf-8")
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+        if self.map is not None:
+            self.map.close()
+        self.db.close()
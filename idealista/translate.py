@@ -0,0 +1,167 @@
+"""Traducción de los comentarios con caché persistente; el backend se importa al primer uso."""
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .metrics import logger, metrics
+
+class TranslationCache:
+    """
+    Caché persistente de traducciones indexada por (hash del texto, idioma).
+    Al superar `max_entries` expulsa las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, path=None, max_entries=None):
+        path = config.translation_cache_file if path is None else path
+        max_entries = config.translation_cache_size if max_entries is None else max_entries
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # Varios procesos de extracción pueden compartir el fichero
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text_hash TEXT, language TEXT, translation TEXT, last_used REAL, "
+            "PRIMARY KEY (text_hash, language))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self.db.commit()
+
+    def get_many(self, text_hash, languages):
+        """Devuelve {idioma: traducción} de los idiomas pedidos que estén en caché."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT language, translation FROM translations WHERE text_hash = ?", (text_hash,)
+            ).fetchall()
+            found = {language: translation for language, translation in rows if language in languages}
+            if found:
+                self.db.executemany(
+                    "UPDATE translations SET last_used = ? WHERE text_hash = ? AND language = ?",
+                    [(time.time(), text_hash, language) for language in found],
+                )
+                self.db.commit()
+        return found
+
+    def put_many(self, text_hash, translations):
+        """
+        Guarda {idioma: traducción} y aplica el límite de tamaño. El tamaño se cuenta en la
+        tabla dentro de la misma transacción: varios procesos escriben en el fichero.
+        """
+        if not translations:
+            return
+        with self.lock:
+            now = time.time()
+            self.db.executemany(
+                "INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?)",
+                [(text_hash, language, translation, now) for language, translation in translations.items()],
+            )
+            size = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if size > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM translations WHERE rowid IN "
+                    "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,),
+                )
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+translation_cache = None
+translators = threading.local()
+
+def get_translation_cache():
+    """Abre la caché de traducciones la primera vez que se necesita."""
+    global translation_cache
+    if translation_cache is None:
+        translation_cache = TranslationCache()
+    return translation_cache
+
+def google_translate(text, lang):
+    """
+    Backend de traducción por defecto: un GoogleTranslator reutilizado por idioma y por hilo.
+    translate() guarda el texto en curso en el propio traductor, así que dos hilos no
+    pueden compartir uno sin intercambiarse los textos.
+    """
+    by_language = translators.__dict__.setdefault("by_language", {})
+    if lang not in by_language:
+        # deep_translator se importa con la primera traducción, no al cargar el paquete
+        from deep_translator import GoogleTranslator
+        by_language[lang] = GoogleTranslator(source='auto', target=lang)
+    return by_language[lang].translate(text)
+
+# Backend de traducción: cualquier función (texto, idioma) -> texto traducido
+translator_backend = google_translate
+
+def translate_comment(comment_text, target_languages=[
+            "ca",  # Català
+            "en",  # English
+            "fr",  # Français
+            "de",  # Deutsch
+            "it",  # Italiano
+            "pt",  # Português
+            "da",  # Dansk
+            "fi",  # Suomi
+            "no",  # Norsk
+            "nl",  # Nederlands
+            "pl",  # Polski
+            "ro",  # Română
+            "ru",  # русский 
+            "sv",  # Svenska
+            "el",  # Ελληνικά
+            "zh-CN",  # 中文
+            "uk",  # Українська
+        ], translator=None, cache=None): #añadir idiomas a elección
+    """
+    Traduce el comentario a los idiomas especificados. Las traducciones ya conocidas
+    salen de la caché y el resto se piden en paralelo al backend de traducción.
+    """
+    translator = translator or translator_backend
+    translations = []
+    
+    # Traducir al idioma original (español)
+    translations.append({
+        "propertyComment": comment_text,
+        "autoTranslated": False,
+        "language": "es",
+        "defaultLanguage": True
+    })
+    if not target_languages:
+        return translations
+
+    cache = cache or get_translation_cache()
+    text_hash = hashlib.sha256(comment_text.encode("utf-8")).hexdigest()
+    translated = cache.get_many(text_hash, target_languages)
+    missing = [lang for lang in target_languages if lang not in translated]
+    # Por metrics y no por la caché: con procesos de extracción la caché vive en cada proceso
+    metrics.count("translation_cache_hits", len(translated))
+    metrics.count("translation_cache_misses", len(missing))
+
+    def translate(lang):
+        try:
+            return lang, translator(comment_text, lang)
+        except Exception as e:
+            metrics.count("translation_errors", lang=lang)
+            logger.warning(f"Error al traducir a {lang}: {e}")
+            return lang, None
+
+    # Traducir a los otros idiomas
+    if missing:
+        metrics.count("translation_calls", len(missing))
+        with metrics.timer("translate"), ThreadPoolExecutor(max_workers=min(config.translation_workers, len(missing))) as pool:
+            new_translations = {lang: text for lang, text in pool.map(translate, missing) if text is not None}
+        cache.put_many(text_hash, new_translations)
+        translated.update(new_translations)
+
+    for lang in target_languages:
+        if lang in translated:
+            translations.append({
+                "propertyComment": translated[lang],
+                "autoTranslated": True,
+                "language": lang,
+                "defaultLanguage": False
+            })
+    
+    return translations
@@ -0,0 +1,90 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from idealista import config, translate
+
+fixtures = Path(__file__).parent / "fixtures"
+
+class StubSite:
+    """
+    Servidor HTTP local con las páginas de tests/fixtures. `script(path, *responses)`
+    encola respuestas (estado, cabeceras, cuerpo[, segundos de retraso]) para una ruta; agotadas, la ruta vuelve
+    a servir su página. `requests` guarda (ruta, cabeceras) de cada petición recibida.
+    """
+
+    def __init__(self):
+        self.scripted = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site.lock:
+                    site.requests.append((self.path, dict(self.headers)))
+                    queue = site.scripted.get(self.path)
+                    status, headers, body, *delay = queue.pop(0) if queue else site.page(self.path)
+                if delay:
+                    time.sleep(delay[0])
+                data = body.encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self, path):
+        """Portada, listados (pagina-2 es el último) y fichas, leídos del corpus."""
+        if path.startswith("/inmueble/"):
+            name = "detail_rent_gallery" if path.startswith("/inmueble/555") else "detail_sale"
+            return 200, {}, (fixtures / f"{name}.html").read_text(encoding="utf-8")
+        if path.startswith("/geo/"):
+            name = "listing_last" if "pagina-2" in path else "listing_page1"
+            return 200, {}, (fixtures / "listings" / f"{name}.html").read_text(encoding="utf-8")
+        return 200, {}, "<html><body>portada</body></html>"
+
+    def script(self, path, *responses):
+        with self.lock:
+            self.scripted.setdefault(path, []).extend(responses)
+
+    def hits(self, path):
+        return [headers for requested, headers in self.requests if requested == path]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_site(monkeypatch, tmp_path):
+    """
+    Sitio local y configuración de rastreo rápida: una sesión, sin pool de procesos,
+    esperas cortas y un backend de traducción falso con su caché en tmp_path.
+    """
+    site = StubSite()
+    monkeypatch.setattr(translate, "translator_backend", lambda text, lang: f"[{lang}] {text}")
+    monkeypatch.setattr(translate, "translation_cache", None)
+    monkeypatch.setattr(config, "translation_cache_file", str(tmp_path / "translations.sqlite"))
+    monkeypatch.setattr(config, "site_url", site.url)
+    monkeypatch.setattr(config, "session_count", 1)
+    monkeypatch.setattr(config, "parse_workers", 0)
+    monkeypatch.setattr(config, "requests_per_second", 100.0)
+    monkeypatch.setattr(config, "burst_size", 100)
+    monkeypatch.setattr(config, "backoff_base", 0.01)
+    monkeypatch.setattr(config, "use_http2", False)
+    yield site
+    site.close()
+    if translate.translation_cache is not None:
+        translate.translation_cache.close()
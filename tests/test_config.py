@@ -0,0 +1,22 @@
+"""Los valores de idealista.config se leen al llamar, no al importar el paquete."""
+from idealista import config
+from idealista.crawler import AsyncCrawler
+from idealista.net import AdaptiveRateLimiter
+from idealista.output import RecordWriter, iter_records
+
+def test_defaults_follow_overrides(monkeypatch):
+    monkeypatch.setattr(config, "max_requests_per_second", 1000.0)
+    monkeypatch.setattr(config, "site_url", "http://127.0.0.1:1/")
+    monkeypatch.setattr(config, "parse_workers", 0)
+    assert AdaptiveRateLimiter(1.0, 1).max_rate == 1000.0
+    crawler = AsyncCrawler(None, None)
+    assert crawler.site_url == "http://127.0.0.1:1"
+    assert crawler.parse_workers == 0
+    assert crawler.metrics_path is None
+
+def test_record_writer_uses_current_output_file(monkeypatch, tmp_path):
+    path = tmp_path / "salida.ndjson"
+    monkeypatch.setattr(config, "output_file", str(path))
+    with RecordWriter() as writer:
+        writer.write({"adid": "1"})
+    assert list(iter_records(path)) == [{"adid": "1"}]
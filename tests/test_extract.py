@@ -0,0 +1,65 @@
+"""
+Extracción de fichas y listados contra el corpus de tests/fixtures.
+
+Cada página tiene su salida esperada en <página>.golden.json, guardada en el
+repositorio. Tras un cambio intencionado de la salida se regeneran con
+UPDATE_GOLDENS=1 python -m pytest tests/test_extract.py y se revisa el diff.
+"""
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from idealista import config, extract
+from idealista.listing import parse_listing
+
+fixtures = Path(__file__).parent / "fixtures"
+detail_pages = sorted(fixtures.glob("*.html"))
+listing_pages = sorted((fixtures / "listings").glob("*.html"))
+backends = [backend for backend in config.parser_backends
+            if backend != "selectolax" or importlib.util.find_spec("selectolax")]
+# URL de la página de listado analizada, para resolver el enlace a la siguiente
+listing_url = "https://www.idealista.com/geo/venta-viviendas/andalucia/pagina-3.htm"
+
+def check_golden(path, render, backend):
+    """Compara la salida de `render(backend)` con el golden; al regenerar, el golden sale de html.parser."""
+    golden_path = path.with_suffix(".golden.json")
+    if os.environ.get("UPDATE_GOLDENS"):
+        golden_path.write_text(render("html.parser"), encoding="utf-8")
+    assert render(backend) == golden_path.read_text(encoding="utf-8"), f"{path.name} con {backend} no coincide con {golden_path.name}"
+
+def test_corpus_is_present():
+    assert detail_pages and listing_pages
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("path", detail_pages, ids=lambda path: path.stem)
+def test_detail_golden(path, backend):
+    html = path.read_text(encoding="utf-8")
+    render = lambda backend: extract.comparable_json(extract.extract_data_from_html(extract.make_soup(html, backend), translate=False))
+    check_golden(path, render, backend)
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("path", listing_pages, ids=lambda path: path.stem)
+def test_listing_golden(path, backend):
+    html = path.read_text(encoding="utf-8")
+    render = lambda backend: json.dumps(parse_listing(html, listing_url, backend), ensure_ascii=False, sort_keys=True, indent=4) + "\n"
+    check_golden(path, render, backend)
+
+@pytest.mark.parametrize("path", detail_pages, ids=lambda path: path.stem)
+def test_lite_matches_full(path):
+    html = path.read_text(encoding="utf-8")
+    full = extract.extract_html(html, "full", translate=False)
+    lite = extract.extract_html(html, "lite")
+    for field_path in ("moreCharacteristics", "allowsRemoteVisit", "has360VHS", "allowsRecommendation", "ubication.locationId"):
+        assert extract.get_path(lite, field_path) == extract.get_path(full, field_path), field_path
+
+def test_full_resolution_is_resolved_on_demand():
+    record = extract.extract_html((fixtures / "detail_rent_gallery.html").read_text(encoding="utf-8"), "full", translate=False)
+    stored = [image["url"] for image in record["multimedia"]["images"]]
+    resolved = extract.with_full_resolution(record)
+    # El registro guardado no cambia; la copia lleva la variante a máxima resolución
+    assert [image["url"] for image in record["multimedia"]["images"]] == stored
+    assert stored and all(f"/{config.full_image_size}/" in image["url"] for image in resolved["multimedia"]["images"])
+    assert [extract.image_key(image["url"]) for image in resolved["multimedia"]["images"]] == list(map(extract.image_key, stored))
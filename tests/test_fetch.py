@@ -0,0 +1,242 @@
+"""Descargas contra el sitio local de conftest: reintentos, bloqueos, errores y caché HTTP."""
+import asyncio
+
+import pytest
+
+from idealista import config
+from idealista.crawler import AsyncCrawler
+from idealista.metrics import metrics
+from idealista.net import FetchError, HttpCache
+from idealista.output import RecordWriter, iter_records
+from idealista.store import AdIndex, CrawlFrontier, DuplicateIndex
+
+detail_path = "/inmueble/12345/"
+
+def run(stub_site, work, **options):
+    """Abre un AsyncCrawler contra el sitio local y ejecuta `work(crawler)`."""
+    async def main():
+        async with AsyncCrawler(None, None, **options) as crawler:
+            return await work(crawler)
+    return asyncio.run(main())
+
+def test_retry_after_backs_off_and_retries(stub_site):
+    stub_site.script(detail_path, (429, {"Retry-After": "0.2"}, ""), (429, {"Retry-After": "0.2"}, ""))
+    retries = metrics.total("retries")
+
+    async def work(crawler):
+        start = asyncio.get_running_loop().time()
+        html = await crawler.fetch(stub_site.url + detail_path)
+        return html, asyncio.get_running_loop().time() - start, crawler.bucket_for(stub_site.url).rate
+
+    html, elapsed, rate = run(stub_site, work)
+    assert 'class="txt-ref">12345' in html
+    assert len(stub_site.hits(detail_path)) == 3
+    assert metrics.total("retries") - retries == 2
+    # Retry-After detiene el host y cada 429 reduce el ritmo
+    assert elapsed >= 0.4
+    assert rate < config.requests_per_second
+
+def test_slow_response_lowers_the_rate(stub_site, monkeypatch):
+    monkeypatch.setattr(config, "slow_response_seconds", 0.2)
+    html = stub_site.page(detail_path)[2]
+    stub_site.script(detail_path, (200, {}, html, 0.3))
+
+    async def work(crawler):
+        limiter = crawler.bucket_for(stub_site.url)
+        before = limiter.rate
+        await crawler.fetch(stub_site.url + detail_path)
+        return before, limiter.rate
+
+    before, after = run(stub_site, work)
+    assert after == before * config.rate_decrease_factor
+
+def test_burst_of_429s_lowers_the_rate_once(stub_site):
+    stub_site.script(detail_path, *[(429, {}, "")] * 5)
+
+    async def work(crawler):
+        limiter = crawler.bucket_for(stub_site.url)
+        before = limiter.rate
+        await asyncio.gather(*(crawler.fetch(stub_site.url + detail_path) for _ in range(5)))
+        return before, limiter.rate
+
+    before, after = run(stub_site, work)
+    assert len(stub_site.hits(detail_path)) == 10
+    # Un solo recorte multiplicativo, seguido de los aumentos aditivos de las respuestas correctas
+    assert before * config.rate_decrease_factor ** 2 < after < before
+
+def test_block_page_rotates_session(stub_site):
+    block = '<html><script src="https://geo.captcha-delivery.com/captcha/"></script></html>'
+    stub_site.script(detail_path, (200, {}, block))
+
+    async def work(crawler):
+        user_agent = crawler.sessions.sessions[0].headers["User-Agent"]
+        html = await crawler.fetch(stub_site.url + detail_path)
+        return html, user_agent
+
+    html, first_agent = run(stub_site, work)
+    assert "captcha" not in html
+    assert len(stub_site.hits(detail_path)) == 2
+    # Tras el bloqueo la sesión repite la aceptación de cookies en la portada
+    assert len(stub_site.hits("/")) == 2
+
+def test_not_found_fails_without_retrying(stub_site):
+    stub_site.script(detail_path, (404, {}, "no existe"))
+
+    async def work(crawler):
+        with pytest.raises(FetchError, match="HTTP 404"):
+            await crawler.fetch(stub_site.url + detail_path)
+
+    run(stub_site, work)
+    assert len(stub_site.hits(detail_path)) == 1
+
+def test_retries_are_bounded(stub_site, monkeypatch):
+    monkeypatch.setattr(config, "max_fetch_retries", 2)
+    stub_site.script(detail_path, *[(503, {}, "")] * 3)
+
+    async def work(crawler):
+        with pytest.raises(FetchError, match="3 intentos"):
+            await crawler.fetch(stub_site.url + detail_path)
+
+    run(stub_site, work)
+    assert len(stub_site.hits(detail_path)) == 3
+
+def test_stale_cache_entry_is_revalidated_with_304(stub_site, tmp_path):
+    html = (stub_site.page(detail_path))[2]
+    stub_site.script(detail_path, (200, {"ETag": '"v1"'}, html), (304, {"ETag": '"v1"'}, ""))
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"), ttl={"landing": 0, "listing": 0, "detail": 0})
+
+    async def work(crawler):
+        first = await crawler.fetch(stub_site.url + detail_path)
+        second = await crawler.fetch(stub_site.url + detail_path)
+        return first, second
+
+    first, second = run(stub_site, work, http_cache=cache)
+    cache.close()
+    assert first == second == html
+    requests = stub_site.hits(detail_path)
+    assert len(requests) == 2
+    assert requests[1].get("If-None-Match") == '"v1"'
+    assert cache.revalidated == 1
+
+def test_crawl_follows_pagination_and_writes_every_ad(stub_site, tmp_path):
+    frontier = CrawlFrontier(str(tmp_path / "frontier.sqlite"))
+    with RecordWriter(str(tmp_path / "out.ndjson")) as writer:
+        async def main():
+            async with AsyncCrawler(writer, frontier) as crawler:
+                await crawler.crawl(f"{stub_site.url}/geo/venta-viviendas/andalucia/")
+                return crawler.cards
+        cards = asyncio.run(main())
+    assert frontier.is_complete()
+    # Fuera del modo incremental no se retienen tarjetas
+    assert cards == {}
+    frontier.close()
+    records = list(iter_records(tmp_path / "out.ndjson"))
+    assert len(records) == 5
+    # Las fichas del corpus llevan su propio adid: las dos del listado de venta y las tres de alquiler
+    assert sorted(record["adid"] for record in records) == ["12345", "12345", "55501", "55501", "55501"]
+
+def test_incremental_crawl_releases_cards_of_failed_details(stub_site, tmp_path):
+    stub_site.script("/inmueble/67890/", (404, {}, "no existe"))
+    frontier = CrawlFrontier(str(tmp_path / "frontier.sqlite"))
+    ad_index = AdIndex(str(tmp_path / "ads.sqlite"))
+    ad_index.begin_run(resuming=False)
+    with RecordWriter(str(tmp_path / "out.ndjson")) as writer:
+        async def main():
+            async with AsyncCrawler(writer, frontier, ad_index=ad_index) as crawler:
+                await crawler.crawl(f"{stub_site.url}/geo/venta-viviendas/andalucia/")
+                return crawler.cards
+        cards = asyncio.run(main())
+    frontier.close()
+    ad_index.close()
+    assert cards == {}
+    assert len(list(iter_records(tmp_path / "out.ndjson"))) == 4
+
+def test_translation_cache_counters_reach_the_parent_from_parse_workers(stub_site, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "parse_workers", 1)
+    counted = metrics.total("translation_cache_hits") + metrics.total("translation_cache_misses")
+
+    async def work(crawler):
+        return await crawler.scrape_detail(stub_site.url + detail_path)
+
+    record = run(stub_site, work)
+    assert record["adid"] == "12345"
+    assert metrics.total("translation_cache_hits") + metrics.total("translation_cache_misses") - counted > 0
+
+def test_copies_in_the_same_batch_are_detected_as_duplicates(stub_site, tmp_path):
+    duplicates = DuplicateIndex(str(tmp_path / "duplicates.sqlite"))
+
+    def copy(adid):
+        return {"adid": adid, "price": "250.000", "ubication": {"latitude": 36.72, "longitude": -4.42},
+                "moreCharacteristics": {"constructedArea": "95", "roomNumber": "3"},
+                "comments": [{"propertyComment": "Piso luminoso con terraza y vistas al mar, cerca de la playa."}]}
+
+    async def work(crawler):
+        records = [copy("1"), copy("2")]
+        await asyncio.gather(*(crawler.resolve_duplicate(record) for record in records))
+        return records
+
+    records = run(stub_site, work, duplicates=duplicates)
+    duplicates.close()
+    assert [record.get("duplicateOf") for record in records] == [None, "1"]
+    assert len(records[0]["comments"]) > 1
+
+def test_concurrent_fetches_are_spread_across_sessions(stub_site, monkeypatch):
+    monkeypatch.setattr(config, "session_count", 4)
+    monkeypatch.setattr(config, "session_assignment", "least-loaded")
+    # Sin ráfaga las peticiones esperan al limitador después de elegir sesión
+    monkeypatch.setattr(config, "burst_size", 1)
+
+    async def work(crawler):
+        used = []
+        for index, session in enumerate(crawler.sessions.sessions):
+            def get(url, *args, index=index, original=session.client.get, **kwargs):
+                if url.endswith(detail_path):
+                    used.append(index)
+                return original(url, *args, **kwargs)
+            session.client.get = get
+        await asyncio.gather(*(crawler.fetch(stub_site.url + detail_path) for _ in range(20)))
+        return used, [session.in_flight for session in crawler.sessions.sessions]
+
+    used, in_flight = run(stub_site, work)
+    assert sorted(used.count(index) for index in range(4)) == [5, 5, 5, 5]
+    assert in_flight == [0, 0, 0, 0]
+
+def test_resumed_cards_crawl_does_not_write_cards_twice(stub_site, tmp_path, monkeypatch):
+    frontier = CrawlFrontier(str(tmp_path / "frontier.sqlite"))
+    path = str(tmp_path / "out.ndjson")
+
+    async def interrupted(self, property_urls):
+        raise RuntimeError("proceso interrumpido")
+
+    async def main(writer):
+        async with AsyncCrawler(writer, frontier, mode="cards") as crawler:
+            await crawler.crawl(f"{stub_site.url}/geo/venta-viviendas/andalucia/")
+
+    # La primera ejecución escribe las tarjetas de la página 1 y muere antes de darla por hecha
+    with monkeypatch.context() as patch:
+        patch.setattr(AsyncCrawler, "scrape_details", interrupted)
+        with RecordWriter(path) as writer:
+            asyncio.run(main(writer))
+    assert not frontier.is_complete()
+    with RecordWriter(path, append=True) as writer:
+        asyncio.run(main(writer))
+    assert frontier.is_complete()
+    frontier.close()
+    adids = [record["adid"] for record in iter_records(path)]
+    assert sorted(adids) == ["12345", "55501", "55502", "55503", "67890"]
+
+def test_http_cache_bound_holds_across_processes(tmp_path):
+    class Response:
+        def __init__(self, text):
+            self.text = text
+            self.headers = {}
+
+    path = str(tmp_path / "http_cache.sqlite")
+    # Dos conexiones al mismo fichero, como dos shards
+    caches = [HttpCache(path, max_bytes=10_000) for _ in range(2)]
+    for index in range(40):
+        caches[index % 2].store(f"https://example.com/{index}", Response(f"{index} ".join(map(str, range(400)))))
+    total = caches[0].db.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+    for cache in caches:
+        cache.close()
+    assert total <= 10_000
@@ -0,0 +1,47 @@
+"""Índice geoespacial: cobertura por geohash y consultas frente a un recorrido completo."""
+import random
+
+import pytest
+
+from idealista.geo import GeoIndex, covering_geohashes, geohash
+from idealista.store import distance_meters
+
+@pytest.fixture(scope="module")
+def points():
+    generator = random.Random(23)
+    # Alrededor de Málaga, con algunos puntos muy alejados
+    return [(str(index), 36.72 + generator.uniform(-0.5, 0.5), -4.42 + generator.uniform(-0.5, 0.5)) for index in range(20000)] + \
+        [("far-north", 60.0, 10.0), ("far-west", 36.72, -120.0)]
+
+@pytest.fixture(scope="module")
+def index(points, tmp_path_factory):
+    index = GeoIndex(str(tmp_path_factory.mktemp("geo") / "geo.sqlite"))
+    for adid, latitude, longitude in points:
+        index.add({"adid": adid, "price": "100.000", "ubication": {"latitude": latitude, "longitude": longitude}})
+    index.commit()
+    yield index
+    index.close()
+
+def test_cover_contains_every_point_of_the_rectangle(points):
+    south, west, north, east = 36.6, -4.55, 36.85, -4.3
+    cells = covering_geohashes(south, west, north, east)
+    for _, latitude, longitude in points:
+        if south <= latitude <= north and west <= longitude <= east:
+            assert geohash(latitude, longitude).startswith(tuple(cells))
+
+@pytest.mark.parametrize("box", [(36.6, -4.55, 36.85, -4.3), (36.7, -4.43, 36.71, -4.42), (36.0, -5.0, 37.5, -3.8)])
+def test_bbox_matches_a_full_scan(index, points, box):
+    south, west, north, east = box
+    expected = {adid for adid, latitude, longitude in points
+                if south <= latitude <= north and west <= longitude <= east}
+    assert {row["adid"] for row in index.bbox(*box)} == expected
+
+@pytest.mark.parametrize("kilometers", [0.5, 5.0, 40.0])
+def test_radius_matches_a_full_scan(index, points, kilometers):
+    center = (36.72, -4.42)
+    expected = {adid for adid, latitude, longitude in points
+                if distance_meters(*center, latitude, longitude) / 1000 <= kilometers}
+    rows = index.radius(*center, kilometers)
+    assert {row["adid"] for row in rows} == expected
+    distances = [row["distance_km"] for row in rows]
+    assert distances == sorted(distances)
@@ -0,0 +1,13 @@
+"""Decisión del modo hybrid sobre qué tarjetas necesitan su ficha."""
+from idealista.listing import needs_detail
+
+required = ("price",)
+
+def test_card_inside_a_filter_range_needs_detail():
+    assert needs_detail({"price": 250000}, {"price": (None, 300000)}, required)
+    assert not needs_detail({"price": 450000}, {"price": (None, 300000)}, required)
+
+def test_card_without_a_filtered_field_needs_detail():
+    filters = {"moreCharacteristics.constructedArea": (80, None)}
+    assert needs_detail({"price": 450000, "moreCharacteristics": {"constructedArea": None}}, filters, required)
+    assert needs_detail({"price": 450000}, filters, required)
@@ -0,0 +1,53 @@
+"""Salida NDJSON comprimida y reanudación tras la muerte del proceso."""
+import shutil
+
+import pytest
+
+from idealista.output import RecordWriter, iter_records, merge_segments
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_resumed_compressed_output_survives_a_killed_run(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / "out.ndjson")
+    writer = RecordWriter(path, compression)
+    for index in range(100):
+        writer.write({"index": index})
+    writer.flush()
+    # Copia del fichero tal como lo deja un proceso muerto: flujo sin cerrar
+    shutil.copy(path, tmp_path / "killed")
+    writer.close()
+    shutil.copy(tmp_path / "killed", path)
+
+    with RecordWriter(path, compression, append=True) as writer:
+        writer.write({"index": 100})
+    assert writer.path == f"{path}.1"
+    merge_segments(path, compression)
+    assert [record["index"] for record in iter_records(path, compression)] == list(range(101))
+    assert not (tmp_path / "out.ndjson.1").exists()
+
+def test_resumed_plain_output_drops_the_partial_last_line(tmp_path):
+    path = str(tmp_path / "out.ndjson")
+    with RecordWriter(path) as writer:
+        for index in range(100):
+            writer.write({"index": index})
+    # Un proceso muerto a mitad de escribir un registro
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"index": 10')
+
+    with RecordWriter(path, append=True) as writer:
+        writer.write({"index": 100})
+    assert writer.path == path
+    assert [record["index"] for record in iter_records(path)] == list(range(101))
+
+def test_parquet_export_resolves_full_resolution_images(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    from idealista import config
+    from idealista.output import write_parquet
+    path = str(tmp_path / "out.ndjson")
+    url = "https://img4.idealista.com/blur/WEB_DETAIL/0/id.pro.es.image.master/1a/2b/123.jpg"
+    with RecordWriter(path) as writer:
+        writer.write({"adid": "1", "multimedia": {"images": [{"url": url, "tag": "salón", "deeplinkUrl": ""}]}})
+    write_parquet(path, str(tmp_path / "parquet"), full_images=True)
+    urls = parquet.read_table(tmp_path / "parquet" / "image_urls.parquet").column("url").to_pylist()
+    assert urls == [url.replace("/WEB_DETAIL/", f"/{config.full_image_size}/")]
@@ -0,0 +1,39 @@
+"""Planificación de shards y rastreo por shards."""
+import os
+
+from idealista import config, shards
+from idealista.output import iter_records
+from idealista.store import AdIndex
+
+def test_split_band_uses_fixed_cuts_then_halves(monkeypatch):
+    monkeypatch.setitem(shards.price_cuts, "sale", [100000, 200000])
+    monkeypatch.setitem(shards.min_price_band, "sale", 5000)
+    assert shards.split_band("sale", (0, None)) == [(0, 100000), (100000, 200000), (200000, None)]
+    # Sin cortes dentro de la banda se parte por la mitad
+    assert shards.split_band("sale", (100000, 200000)) == [(100000, 150000), (150000, 200000)]
+    # Las bandas abiertas sin cortes o ya mínimas no se parten
+    assert shards.split_band("sale", (200000, None)) == []
+    assert shards.split_band("sale", (100000, 104000)) == []
+
+def test_sharded_incremental_crawl_emits_deltas(stub_site, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "shard_dir", str(tmp_path / "shards"))
+    monkeypatch.setattr(config, "shard_workers", 1)
+    monkeypatch.setattr(config, "incremental", True)
+    monkeypatch.setattr(config, "ad_index_file", str(tmp_path / "ads.sqlite"))
+    monkeypatch.setattr(config, "output_file", str(tmp_path / "out.ndjson"))
+    monkeypatch.setattr(config, "metrics_file", None)
+
+    def changes():
+        return sorted((item["change"], item["adid"]) for item in iter_records(config.output_file))
+
+    shards.crawl_sharded()
+    assert changes() == [("added", adid) for adid in ["12345", "55501", "55502", "55503", "67890"]]
+
+    # Un anuncio de una ejecución anterior que ya no aparece en ningún shard
+    index = AdIndex(config.ad_index_file)
+    index.begin_run(resuming=True)
+    index.update("99999", "/inmueble/99999/", None, {"adid": "99999"})
+    index.close()
+    shards.crawl_sharded()
+    assert changes() == [("removed", "99999")]
+    assert os.path.exists(os.path.join(config.shard_dir, "removed.ndjson"))
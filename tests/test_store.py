@@ -0,0 +1,15 @@
+"""Índice incremental de anuncios."""
+from idealista.store import AdIndex
+
+def test_listed_ad_is_not_removed_when_its_detail_fails(tmp_path):
+    index = AdIndex(str(tmp_path / "ads.sqlite"))
+    index.begin_run(resuming=False)
+    assert index.select_changed([{"adid": "1", "fingerprint": "a"}])
+    index.update("1", "/inmueble/1/", "a", {"adid": "1"})
+    index.begin_run(resuming=False)
+    # La tarjeta cambió pero la ficha no llega a descargarse (no se llama a update)
+    assert index.select_changed([{"adid": "1", "fingerprint": "b"}]) == [{"adid": "1", "fingerprint": "b"}]
+    assert index.mark_removed() == []
+    index.begin_run(resuming=False)
+    assert index.mark_removed() == ["1"]
+    index.close()
@@ -0,0 +1,42 @@
+"""Backend de traducción por defecto."""
+import sys
+import threading
+import types
+
+from idealista import translate
+
+def test_google_translator_is_not_shared_between_threads(monkeypatch):
+    class GoogleTranslator:
+        def __init__(self, source, target):
+            self.target = target
+
+        def translate(self, text):
+            return self
+
+    monkeypatch.setitem(sys.modules, "deep_translator", types.SimpleNamespace(GoogleTranslator=GoogleTranslator))
+    monkeypatch.setattr(translate, "translators", threading.local())
+    used = []
+
+    def translate_twice():
+        used.append([translate.google_translate("hola", "en"), translate.google_translate("adiós", "en")])
+
+    threads = [threading.Thread(target=translate_twice) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Cada hilo reutiliza su traductor, pero nunca el de otro hilo
+    (first, again), (other, other_again) = used
+    assert first is again and other is other_again
+    assert first is not other
+
+def test_translation_cache_bound_holds_across_processes(tmp_path):
+    path = str(tmp_path / "translations.sqlite")
+    # Dos conexiones al mismo fichero, como dos procesos de extracción
+    caches = [translate.TranslationCache(path, max_entries=10) for _ in range(2)]
+    for index in range(20):
+        caches[index % 2].put_many(f"hash{index}", {"en": f"text {index}"})
+    count = caches[0].db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+    for cache in caches:
+        cache.close()
+    assert count == 10